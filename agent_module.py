@@ -1,45 +1,112 @@
-import pandas as pd
-from langchain_experimental.utilities import PythonREPL
-from typing import Annotated, List, Optional, Tuple
+from typing import Annotated, Optional
 from pydantic import BaseModel, Field
-from pydantic_ai.models.openai import OpenAIChatModel, OpenAIChatModelSettings
+from pydantic_ai.models.openai import OpenAIChatModel
 import json
-import re
 import dotenv
 from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai import Agent, RunContext, ModelRetry
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_core import from_json
 from dataclasses import dataclass
-from markdown_pdf import MarkdownPdf, Section
-from pydantic_ai.models import openai
-import dotenv
-import tabulate
 from pinecone import Pinecone
+from pinecone.exceptions import PineconeApiException
 import os
-from dotenv import load_dotenv
-from pathlib import Path
-from PIL import Image
 from langchain_openai import OpenAIEmbeddings
-import os
-from pydantic_ai.models import ModelSettings
-from openai import OpenAI
-from contextlib import redirect_stdout
-from io import StringIO
-from pathlib import Path
-from datetime import datetime
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from datetime import date
+from functools import lru_cache
+import asyncio
+import atexit
+import itertools
+import threading
+from operator import itemgetter
+import httpx
+import numpy as np
+import tenacity
 import logfire
+from content_store import DescriptionStore
+from retrieval_cache import EmbeddingCache, HotDocumentCache, SemanticCache
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+    _loads = json.loads
 
 
 dotenv.load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-large")
+# Every agent run executes on this one long-lived loop, so the pooled client below and the
+# connections it keeps are never touched from a loop other than the one they were opened on
+agent_loop = asyncio.new_event_loop()
+threading.Thread(target=agent_loop.run_forever, name="agent-loop", daemon=True).start()
+
+# One HTTP/2 connection pool, with compressed responses, shared by the chat model and embeddings
+shared_http = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    headers={"Accept-Encoding": "gzip"},
+)
+
+# Matryoshka-truncated text-embedding-3-large vectors, the index must be built at the same dimension
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1024"))
+PINECONE_INDEX = os.getenv("PINECONE_INDEX", "agusto-demo-1024")
+
+embedding_model = OpenAIEmbeddings(
+    model="text-embedding-3-large", dimensions=EMBEDDING_DIMENSIONS, http_async_client=shared_http
+)
+embed_cache = EmbeddingCache(".embed_cache", namespace=f"{embedding_model.model}:{EMBEDDING_DIMENSIONS}")
+description_store = DescriptionStore("descriptions.sqlite")
+# A hot hit only has to beat this score within the few cached documents, a cold document that would
+# score higher is never consulted. Raising it trades fewer Pinecone round-trips for less stickiness
+hot_documents = HotDocumentCache(min_score=float(os.getenv("HOT_DOCUMENT_MIN_SCORE", "0.6")))
 pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("agusto-demo")
+index_host = pc.describe_index(PINECONE_INDEX).host
+# The upload notebook rewrites descriptions.sqlite with every upload, its mtime stands in for the corpus version
+_corpus_version = int(os.path.getmtime(description_store.path)) if os.path.exists(description_store.path) else 0
+semantic_cache = SemanticCache(
+    ".semantic_cache.npz",
+    namespace=f"{PINECONE_INDEX}:{embedding_model.model}:{EMBEDDING_DIMENSIONS}:{_corpus_version}",
+)
+# Entries added since the last periodic write are kept across restarts too
+atexit.register(semantic_cache.persist)
+# Opened on first use, on agent_loop, and kept so queries reuse its warm connections
+_async_index = None
+
+SCORE_THRESHOLD = 0.1
+# Matches fetched from Pinecone, and how many of those are handed to the agent
+TOP_K = 3
+MAX_MATCHES = 3
+# Above this many candidates, thresholding and top-k selection switch to NumPy
+_VECTORIZE_MIN_MATCHES = 20
+NO_MATCH_MESSAGE = "No relevant information found"
+_get_match_metadata = itemgetter('document_path', 'page_number')
+
+
+# Caps on concurrent in-flight requests, sized to the account's rate limits. Every call runs
+# on agent_loop, so these bind to it and cap all sessions together
+openai_inflight = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_INFLIGHT", "32")))
+pinecone_inflight = asyncio.Semaphore(int(os.getenv("PINECONE_MAX_INFLIGHT", "32")))
 
 
 
 
 logfire.configure(token=os.getenv("LOGFIRE_TOKEN"), scrubbing=False)
+# Per-request timing for every OpenAI call and every HTTP request made through httpx
+logfire.instrument_openai()
+logfire.instrument_httpx()
+
+if not os.path.exists(description_store.path):
+    logfire.warn("{path} not found, retrieved pages will have no content until the upload notebook is run",
+                 path=description_store.path)
 
 
 @dataclass
@@ -58,17 +125,14 @@ class agent_response(BaseModel):
     metrics_dict: str = Field(description = "A string of metrics calculated from the document in form of a dictionary as returned by the metric_calculator tool")
     
 # initializing model
-model = OpenAIChatModel('gpt-4.1', provider=OpenAIProvider(api_key=os.getenv('OPENAI_API_KEY')))
+model = OpenAIChatModel('gpt-4.1', provider=OpenAIProvider(api_key=os.getenv('OPENAI_API_KEY'), http_client=shared_http))
 agent = Agent(model=model, deps_type=agent_state, output_type=agent_response, instrument=True)
 
-current_date = datetime.now().strftime("%Y-%m-%d")
-
-@agent.system_prompt
-def get_agent_system_prompt(ctx: RunContext[agent_state]):
-    
-    prompt = f"""
+_PROMPT_HEAD = """
    you are an agent that can answer questions about the knowledge base.
-   The user query is:\n {ctx.deps.user_query} and the current date is {current_date}\n
+   The user query is:\n """
+_PROMPT_MID = " and the current date is "
+_PROMPT_TAIL = """\n
     
    Follow the following steps:
     1. Understand the user query and identify what information the user is looking for
@@ -102,58 +166,301 @@ def get_agent_system_prompt(ctx: RunContext[agent_state]):
     5. The path to the generated PDF report, not subfolder only the pdf file name - do not include this in the markdown report
     6. Key metrics calculated from the document in form of a dictionary - do not include this in the markdown report
     """
-    
-    return prompt
 
 
-@agent.tool
-def retreive_data_from_document(ctx: RunContext[None],
-                           query: Annotated[str, "The user query"]):
+@lru_cache(maxsize=1)
+def _format_date(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%Y-%m-%d")
+
+
+@agent.system_prompt
+def get_agent_system_prompt(ctx: RunContext[agent_state]):
+    # Only the query and the date vary, everything else is spliced in as-is
+    today = _format_date(date.today().toordinal())
+    return f"{_PROMPT_HEAD}{ctx.deps.user_query}{_PROMPT_MID}{today}{_PROMPT_TAIL}"
+
+
+def _is_transient(exception: BaseException) -> bool:
     """
-    Function to retreive information from the relevant document including the metada of the document
+    Whether a failed OpenAI or Pinecone call is worth retrying
     """
-    embedded_query = embedding_model.embed_query(query)
-    result = index.query(vector=embedded_query, top_k=3, include_metadata=True)
+    if isinstance(exception, (RateLimitError, APIConnectionError, InternalServerError)):
+        return True
+    if isinstance(exception, PineconeApiException):
+        return exception.status == 429 or (exception.status or 0) >= 500
+    return False
+
 
-    score_threshold = 0.1
+_backoff = tenacity.wait_exponential_jitter(initial=1, max=30)
+
+
+def _wait_retry_after(retry_state: tenacity.RetryCallState) -> float:
+    """
+    Wait for the server's Retry-After when it sends one, otherwise back off exponentially
+    """
+    exception = retry_state.outcome.exception()
+    response = getattr(exception, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exception, "headers", None) or {}
+    retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return min(float(retry_after), 30.0)
+    except (TypeError, ValueError):
+        return _backoff(retry_state)
 
-    match_list = []
-    for match in result['matches']:
-        if match['score'] > score_threshold:
-            match_list.append(match)
+
+_network_retry = tenacity.retry(
+    retry=tenacity.retry_if_exception(_is_transient),
+    wait=_wait_retry_after,
+    stop=tenacity.stop_after_attempt(5),
+    reraise=True,
+)
+
+
+def _index():
+    """
+    The process-wide Pinecone async index, only ever used on agent_loop
+    """
+    global _async_index
+    # Created inside the loop, its aiohttp session binds to the running loop
+    if _async_index is None:
+        _async_index = pc.IndexAsyncio(host=index_host)
+    return _async_index
+
+
+@_network_retry
+async def _aembed_query(query: str) -> list[float]:
+    async with openai_inflight:
+        return await embedding_model.aembed_query(query)
+
+
+@_network_retry
+async def _aembed_documents(queries: list[str]) -> list[list[float]]:
+    async with openai_inflight:
+        return await embedding_model.aembed_documents(queries)
+
+
+@_network_retry
+async def _pc_query(async_index, embedded_query: list[float]):
+    async with pinecone_inflight:
+        return await async_index.query(vector=embedded_query, top_k=TOP_K, include_metadata=True)
+
+
+async def _embed(query: str) -> list[float]:
+    """
+    Embed a query, serving repeated queries from the embedding cache
+    """
+    embedded_query = embed_cache.get(query)
+    if embedded_query is None:
+        embedded_query = await _aembed_query(query)
+        embed_cache.set(query, embedded_query)
+    return embedded_query
+
+
+async def _embed_many(queries: list[str]) -> list[list[float]]:
+    """
+    Embed several queries, sending only the cache misses to OpenAI in a single batch
+    """
+    embedded_queries = [embed_cache.get(query) for query in queries]
+    missing = [i for i, embedded_query in enumerate(embedded_queries) if embedded_query is None]
+    if missing:
+        fresh = await _aembed_documents([queries[i] for i in missing])
+        for i, embedded_query in zip(missing, fresh):
+            embed_cache.set(queries[i], embedded_query)
+            embedded_queries[i] = embedded_query
+    return embedded_queries
+
+
+def _img_to_pdf_name(name: str) -> str:
+    """
+    Turn a "<document>_page_NN.png" page image name into "<document>.pdf"
+    """
+    # Fixed-shape suffix, so plain slicing is enough and no regex engine is involved
+    if len(name) >= 12 and name.endswith('.png') and name[-12:-6] == '_page_' and name[-6:-4].isdigit():
+        return name[:-12] + '.pdf'
+    return name
+
+
+def _select_matches(matches) -> list:
+    """
+    Keep the best MAX_MATCHES matches that clear the score threshold, best first
+    """
+    if len(matches) <= _VECTORIZE_MIN_MATCHES:
+        # Pinecone returns matches sorted by descending score
+        return list(itertools.takewhile(lambda match: match['score'] > SCORE_THRESHOLD, matches))[:MAX_MATCHES]
+
+    scores = np.fromiter((match['score'] for match in matches), dtype=np.float32, count=len(matches))
+    keep = np.flatnonzero(scores > SCORE_THRESHOLD)
+    if len(keep) > MAX_MATCHES:
+        keep = keep[np.argpartition(-scores[keep], MAX_MATCHES)[:MAX_MATCHES]]
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+    return [matches[i] for i in keep]
+
+
+def _format_matches(matches) -> Optional[str]:
+    """
+    Build the tool output from Pinecone matches, or None if none clear the score threshold
+    """
+    match_list = _select_matches(matches)
 
     if len(match_list) == 0:
-        return "No relevant information found"
+        return None
     
-    document_name = re.sub(r'_page_[0-9][0-9]\.png', '.pdf', match_list[0]['metadata']['document_name'])
+    # Vectors upserted before the ingest precomputed these fields still need the derivation here
+    top_metadata = match_list[0]['metadata']
+    document_name = top_metadata.get('document_name_pdf') or _img_to_pdf_name(top_metadata['document_name'])
+    # Descriptions are kept out of Pinecone metadata and looked up locally in one batch
+    stored_ids = [match['id'] for match in match_list if 'image_description' not in match['metadata']]
+    stored_descriptions = description_store.get_many(stored_ids)
+    if len(stored_descriptions) < len(stored_ids):
+        logfire.warn(
+            "No stored description for {ids}, {path} is missing or was not populated by the upload notebook",
+            ids=[vector_id for vector_id in stored_ids if vector_id not in stored_descriptions],
+            path=description_store.path,
+            )
     document_path_list = []
-    for match in match_list:
-        document_path_list.append(Path(match['metadata']['document_path'].replace('\\', '/')))
-    document_path = str(document_path_list)
     page_number_list = []
     page_description_list = []
     for match in match_list:
-        page_number_list.append(match['metadata']['page_number'].replace('page_', ''))
+        document_path, page_number = _get_match_metadata(match['metadata'])
+        image_description = match['metadata'].get('image_description') or stored_descriptions.get(match['id'], '')
+        document_path_list.append(document_path.replace('\\', '/'))
+        page_number_int = match['metadata'].get('page_number_int')
+        page_number_list.append(
+            str(int(page_number_int)) if page_number_int is not None else page_number.removeprefix('page_')
+            )
         page_description_list.append(
-            ["Source: " + document_name + ", Page Number: " + str(match['metadata']['page_number'])
-             + ",\n Content: " + str(match['metadata']['image_description']) + "\n"]
+            f"Source: {document_name}, Page Number: {page_number},\n Content: {image_description}\n"
             )
 
-    page_number = str(page_number_list)
-    page_description = str(page_description_list)
     score = match_list[0]['score']
     id = match_list[0]['id']
     
     match_dict = {
             'document_name': document_name,
-            'document_path': document_path,
-            'page_number': page_number,
-            'page_description': page_description,
+            'document_path': list(dict.fromkeys(document_path_list)),
+            'page_number': page_number_list,
+            'page_description': page_description_list,
             'score': score,
             'id': id
         }
     
-    return str(match_dict)
+    return _dumps(match_dict)
+
+
+def _document_id(vector_id: str) -> str:
+    """
+    Map a page vector id such as "<document>_page_3" to its document
+    """
+    return vector_id.rsplit('_page_', 1)[0]
+
+
+async def _warm_document(async_index, document_id: str) -> None:
+    """
+    Load every page vector of a document into the hot document cache
+    """
+    ids, vectors, metadata = [], [], []
+    try:
+        with logfire.span("retrieve.warm_document", document_id=document_id):
+            async for page_ids in async_index.list(prefix=document_id + '_page_'):
+                fetched = await async_index.fetch(ids=page_ids)
+                for page_id, vector in fetched.vectors.items():
+                    ids.append(page_id)
+                    vectors.append(vector.values)
+                    metadata.append(vector.metadata or {})
+    except Exception as error:
+        # Only an optimization, and nobody awaits it, so every failure ends here
+        logfire.warn("Could not cache vectors of {document_id}: {error}", document_id=document_id, error=str(error))
+        return
+
+    if ids:
+        hot_documents.add(document_id, ids, vectors, metadata)
+
+
+# Warm-ups in flight by document id, holding the only references that keep the tasks alive
+_warm_tasks: dict[str, asyncio.Task] = {}
+
+
+def _schedule_warm_document(async_index, vector_id: str) -> None:
+    """
+    Warm the document a match belongs to in the background, at most once at a time per document
+    """
+    document_id = _document_id(vector_id)
+    if document_id in hot_documents or document_id in _warm_tasks:
+        return
+    task = asyncio.create_task(_warm_document(async_index, document_id), name=f"warm:{document_id}")
+    _warm_tasks[document_id] = task
+    task.add_done_callback(lambda _: _warm_tasks.pop(document_id, None))
+
+
+async def _query_index(async_index, embedded_query: list[float]) -> str:
+    """
+    Run one query, locally against hot documents when they match well enough,
+    otherwise on Pinecone, caching the formatted result of Pinecone searches
+    """
+    with logfire.span("retrieve.hot_documents"):
+        matches = hot_documents.query(embedded_query, TOP_K)
+    from_pinecone = matches is None
+    if from_pinecone:
+        with logfire.span("retrieve.pinecone", top_k=TOP_K):
+            result = await _pc_query(async_index, embedded_query)
+        matches = result['matches']
+        if matches:
+            # Not awaited, this query is answered from the Pinecone result in hand
+            _schedule_warm_document(async_index, matches[0]['id'])
+
+    with logfire.span("retrieve.serialize"):
+        match_result = _format_matches(matches)
+    if match_result is None:
+        return NO_MATCH_MESSAGE
+
+    # Only full searches are cached, a hot document answer may miss a better cold document
+    # and would otherwise be persisted and served across restarts
+    if from_pinecone:
+        semantic_cache.add(embedded_query, match_result)
+    return match_result
+
+
+@agent.tool
+async def retreive_data_from_document(ctx: RunContext[None],
+                           query: Annotated[str, "The user query"]):
+    """
+    Function to retreive information from the relevant document including the metada of the document
+    """
+    with logfire.span("retrieve.embed", query_len=len(query)):
+        embedded_query = await _embed(query)
+    with logfire.span("retrieve.semantic_cache"):
+        cached_result = semantic_cache.lookup(embedded_query)
+    if cached_result is not None:
+        return cached_result
+
+    return await _query_index(_index(), embedded_query)
+
+
+@agent.tool
+async def retreive_data_from_documents(ctx: RunContext[None],
+                           queries: Annotated[list[str], "The sub-queries to look up in one batch"]):
+    """
+    Function to retreive information for several related queries at once, use this instead of
+    calling retreive_data_from_document repeatedly when a question needs multiple lookups
+    """
+    with logfire.span("retrieve.embed", queries=len(queries)):
+        embedded_queries = await _embed_many(queries)
+    with logfire.span("retrieve.semantic_cache"):
+        results = [semantic_cache.lookup(embedded_query) for embedded_query in embedded_queries]
+    missing = [i for i, match_result in enumerate(results) if match_result is None]
+
+    if missing:
+        async_index = _index()
+        fresh = await asyncio.gather(
+            *(_query_index(async_index, embedded_queries[i]) for i in missing)
+        )
+        for i, match_result in zip(missing, fresh):
+            results[i] = match_result
+
+    return _dumps({
+        query: match_result if match_result == NO_MATCH_MESSAGE else _loads(match_result)
+        for query, match_result in zip(queries, results)
+    })
 
 '''
 @agent.tool
@@ -165,6 +472,8 @@ def write_markdown_to_file(ctx: RunContext[None], content: Annotated[str, "The m
     - content: The markdown content to write.
     - filename: The name of the file (with or without .md extension).
     """
+    from markdown_pdf import MarkdownPdf, Section
+
     # Ensure filename has .md extension
     if not filename.endswith('.md'):
         filename += '.md'
@@ -187,6 +496,9 @@ def metric_calculator(ctx: RunContext[None], code: Annotated[str, "The python co
     Parameters:
     - code: The python code to execute to run calculations.
     """
+    from contextlib import redirect_stdout
+    from io import StringIO
+
     catcher = StringIO()
     try:    
         with redirect_stdout(catcher):
@@ -198,11 +510,74 @@ def metric_calculator(ctx: RunContext[None], code: Annotated[str, "The python co
     
 
 # Running the agent
-def run_agent(user_prompt: str):
+async def run_agent(user_prompt: str):
     user_prompt = user_prompt
     deps = agent_state(user_query=user_prompt)
-    result = agent.run_sync(user_prompt, deps=deps)
+    result = await agent.run(user_prompt, deps=deps)
 
     return result.output
 
-    
\ No newline at end of file
+
+def run_agent_sync(user_prompt: str):
+    """
+    Blocking wrapper around run_agent, safe to call from any thread
+    """
+    return asyncio.run_coroutine_threadsafe(run_agent(user_prompt), agent_loop).result()
+
+
+def _partial_markdown_report(response: ModelResponse) -> str:
+    """
+    Extract the markdown report generated so far from a partially streamed output tool call
+    """
+    for part in response.parts:
+        if not isinstance(part, ToolCallPart):
+            continue
+        args = part.args
+        if isinstance(args, str):
+            try:
+                args = from_json(args, allow_partial='trailing-strings')
+            except ValueError:
+                continue
+        if isinstance(args, dict) and isinstance(args.get('markdown_report'), str):
+            return args['markdown_report']
+    return ""
+
+
+# Marks the end of a streamed report, after the last chunk
+_STREAM_END = object()
+
+
+async def _stream_report(user_prompt: str, emit) -> None:
+    """
+    Run the agent on agent_loop, passing each new chunk of the markdown report to emit
+    """
+    deps = agent_state(user_query=user_prompt)
+    emitted = 0
+    async with agent.run_stream(user_prompt, deps=deps) as stream:
+        async for response, _ in stream.stream_responses(debounce_by=None):
+            markdown_report = _partial_markdown_report(response)
+            if len(markdown_report) > emitted:
+                emit(markdown_report[emitted:])
+                emitted = len(markdown_report)
+
+
+async def stream_agent(user_prompt: str):
+    """
+    Run the agent, yielding the markdown report in chunks as the model generates it.
+    Can be consumed from any event loop, the run itself happens on agent_loop.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+
+    def emit(chunk):
+        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+    run = asyncio.run_coroutine_threadsafe(_stream_report(user_prompt, emit), agent_loop)
+    run.add_done_callback(lambda _: emit(_STREAM_END))
+    try:
+        while (chunk := await chunks.get()) is not _STREAM_END:
+            yield chunk
+        # Re-raises the error of a failed run
+        run.result()
+    finally:
+        run.cancel()
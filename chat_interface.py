@@ -1,23 +1,57 @@
 import streamlit as st
 import json
+import ast
 from pathlib import Path
 import base64
+import hashlib
+import PIL
 from PIL import Image
 import os
-from agent_module import run_agent
-import asyncio
-import nest_asyncio
+import glob
+import mmap
+import shutil
+from agent_module import run_agent_sync
+from pdf_to_png_converter import convert_pdf_to_images
+from ui_assets import ALL_CSS, FOOTER_HTML, header_html
 import uuid
 import re
+import string
 from datetime import datetime
 from typing import Annotated, List, Optional, Tuple
 from markdown_pdf import MarkdownPdf, Section
 from streamlit_elements import elements, mui, html, sync
 import streamlit.components.v1 as components
 from io import BytesIO
-
-# Apply nest_asyncio to allow nested event loops
-nest_asyncio.apply()
+from concurrent.futures import ThreadPoolExecutor
+import logfire
+
+try:
+    import pybase64
+    # Only use pybase64 when its SIMD C extension is built, its pure-Python fallback is slower than stdlib
+    from pybase64 import _pybase64  # noqa: F401
+    b64encode_str = pybase64.b64encode_as_string
+except ImportError:
+    def b64encode_str(data) -> str:
+        return base64.b64encode(data).decode()
+
+def b64encode_file(path) -> str:
+    """Base64 encode a file from a read-only memory map instead of copying it into a bytes object."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return b64encode_str(mm)
+
+try:
+    from blake3 import blake3 as content_hasher
+except ImportError:
+    def content_hasher():
+        return hashlib.blake2b(digest_size=16)
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 # Initialize session state
 if "file_hashes" not in st.session_state:
@@ -27,25 +61,115 @@ if "file_hashes" not in st.session_state:
 def get_base64_image_src(img_path):
     """Caches and returns base64 encoded image source."""
     try:
-        with open(img_path, "rb") as img_file:
-            img_data = base64.b64encode(img_file.read()).decode()
-            return f"data:image/png;base64,{img_data}" # Assuming png, adjust if needed
+        img_data = b64encode_file(img_path)
+        return f"data:image/png;base64,{img_data}" # Assuming png, adjust if needed
     except Exception as e:
         st.warning(f"Error loading document: {e}")
         return img_path
     
 
+@st.cache_resource(show_spinner=False)
+def _log_pil_build():
+    """Log the Pillow build once per server process, Pillow-SIMD reports a version ending in .postN."""
+    logfire.info("Resizing images with Pillow {version}", version=PIL.__version__)
+
+# Called from the script thread, the resize helpers below run on worker threads
+_log_pil_build()
+
+# Image decoding and base64 encoding release the GIL, so a few threads scale with cores
+_IMAGE_WORKERS = min(8, os.cpu_count() or 1)
+
+def _map_images(encode, img_paths):
+    """
+    Run encode over img_paths on a thread pool. Results keep the input order,
+    a failed image yields its exception so the caller can warn from the script thread.
+    """
+    if not img_paths:
+        return []
+    with ThreadPoolExecutor(max_workers=min(_IMAGE_WORKERS, len(img_paths))) as pool:
+        futures = [pool.submit(encode, img_path) for img_path in img_paths]
+    return [future.exception() or future.result() for future in futures]
+
+def _encode_png_data_uri(img_path):
+    return f"data:image/png;base64,{b64encode_file(img_path)}"
+
+def _resize_to_jpeg(img_path, max_width=1000, max_height=800, quality=78, subsampling=2, optimize=False):
+    """
+    Resize an image and return the JPEG bytes, raising on failure.
+    subsampling=2 is 4:2:0 chroma, optimize adds a Huffman pass worth ~5% bytes at twice the encode time.
+    """
+    img = Image.open(img_path)
+    # Let JPEGs decode at a reduced DCT scale, no-op for other formats
+    img.draft("RGB", (max_width, max_height))
+    # Bilinear is plenty for large downscales of preview images and much cheaper than Lanczos
+    ratio = max(img.width / max_width, img.height / max_height)
+    resample = Image.Resampling.BILINEAR if ratio >= 2 else Image.Resampling.LANCZOS
+    img.thumbnail((max_width, max_height), resample)  # Resize in place, aspect ratio preserved
+
+    buffered = BytesIO()
+    img.save(buffered, format="JPEG", quality=quality, progressive=True, subsampling=subsampling,
+             optimize=optimize)
+    return buffered.getvalue()
+
+def _resize_to_data_uri(img_path, max_width=1000, max_height=800, quality=78, subsampling=2, optimize=False):
+    """
+    Resize an image and return it as a base64 JPEG data URI, raising on failure.
+    Already encoded data URIs are returned as they are.
+    """
+    if img_path.startswith("data:"):
+        return img_path
+    img_data = b64encode_str(_resize_to_jpeg(img_path, max_width, max_height, quality, subsampling, optimize))
+    return f"data:image/jpeg;base64,{img_data}" # Changed to image/jpeg
+
+# Resized copies of the images embedded in exported PDFs
+PDF_IMAGE_DIR = ".pdf_images"
+# Bounds on the export caches, the least recently used files go once a cache outgrows them
+MAX_PDF_IMAGES = 256
+MAX_CACHED_PDFS = 32
+
+def _prune_oldest(paths, keep):
+    """Delete all but the keep most recently modified of paths, reuse refreshes a file's mtime."""
+    dated = []
+    for path in paths:
+        try:
+            dated.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    dated.sort(reverse=True)
+    for _, path in dated[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _resize_to_pdf_image(img_path):
+    """
+    Resize an image for an exported PDF and return a path MarkdownPdf reads directly,
+    so the bytes skip the base64 round-trip. Copies are reused while the source is unchanged.
+    """
+    if img_path.startswith("data:"):
+        return img_path
+    source = os.path.abspath(img_path)
+    key = hashlib.blake2b(f"{source}\0{os.path.getmtime(source)}".encode(), digest_size=16).hexdigest()
+    resized_path = f"{PDF_IMAGE_DIR}/{key}.jpg"
+    if os.path.exists(resized_path):
+        os.utime(resized_path)
+    else:
+        os.makedirs(PDF_IMAGE_DIR, exist_ok=True)
+        # The PDF is the download, spend the extra pass on its size
+        jpeg_bytes = _resize_to_jpeg(source, optimize=True)
+        tmp_path = f"{resized_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(jpeg_bytes)
+        os.replace(tmp_path, resized_path)
+    return resized_path
+
 @st.cache_data
-def get_resized_base64_image_src(img_path, max_width=1000, max_height=800):
+def get_resized_base64_image_src(img_path, max_width=1000, max_height=800, quality=78, subsampling=2,
+                                 optimize=False):
     """Caches, resizes, and returns base64 encoded image source."""
     try:
-        img = Image.open(img_path)
-        img.thumbnail((max_width, max_height))  # Resize in place, aspect ratio preserved
-
-        buffered = BytesIO()
-        img.save(buffered, format="JPEG", optimize=True) # Use JPEG, optimize for size
-        img_data = base64.b64encode(buffered.getvalue()).decode()
-        return f"data:image/jpeg;base64,{img_data}" # Changed to image/jpeg
+        return _resize_to_data_uri(img_path, max_width, max_height, quality, subsampling, optimize)
     except Exception as e:
         st.warning(f"Error loading or resizing image: {e}")
         return get_base64_image_src(img_path)
@@ -53,40 +177,59 @@ def get_resized_base64_image_src(img_path, max_width=1000, max_height=800):
 @st.cache_data
 def write_markdown_to_file(content: Annotated[str, "The markdown content to write"], 
                         filename: Annotated[str, "The name of the file (with or without .md extension)"] = "blog.md",
-                        image_paths: Annotated[List[str], "The list of image paths to include in the markdown file"] = []) -> str:
+                        image_paths: Annotated[List[str], "The list of image paths to include in the markdown file"] = []) -> Tuple[str, Optional[bytes]]:
     """
     Write markdown content to a file with .md extension and create PDF with appended images.
     Uses Streamlit caching to prevent redundant file operations.
+    Returns the status message and the PDF bytes, None if the PDF could not be created.
     """
     try:
         # Ensure filename has .md extension
         md_filename = filename.replace('.pdf', '.md') if filename.endswith('.pdf') else filename
         pdf_filename = filename.replace('.md', '.pdf')
         
-        # Create deterministic hash of content and image paths
-        content_hash = hash(f"{content}_{tuple(image_paths)}")
+        # Create deterministic hash of content and images, stable across processes unlike hash().
+        # Each image's mtime and size are covered too, so regenerated page images give a new PDF
+        hasher = content_hasher()
+        hasher.update(content.encode())
+        for img_path in image_paths:
+            hasher.update(b"\0" + img_path.encode())
+            try:
+                stat = os.stat(img_path)
+            except (OSError, ValueError):
+                continue
+            hasher.update(f"\0{stat.st_mtime_ns}\0{stat.st_size}".encode())
+        content_hash = hasher.hexdigest()
+        # Every rendered PDF is kept under its digest, so identical exports survive restarts
+        cached_pdf_filename = f"{pdf_filename}.{content_hash[:16]}.pdf"
         
         # Check if file exists and hash matches
-        if md_filename in st.session_state.file_hashes:
-            if st.session_state.file_hashes[md_filename] == content_hash:
-                if os.path.exists(pdf_filename):
-                    return f"File {filename} already exists with same content."
+        if st.session_state.file_hashes.get(md_filename) == content_hash and os.path.exists(pdf_filename):
+            with open(pdf_filename, 'rb') as f:
+                return f"File {filename} already exists with same content.", f.read()
+        if os.path.exists(cached_pdf_filename):
+            os.utime(cached_pdf_filename)
+            with open(cached_pdf_filename, 'rb') as f:
+                pdf_bytes = f.read()
+            with open(pdf_filename, 'wb') as f:
+                f.write(pdf_bytes)
+            st.session_state.file_hashes[md_filename] = content_hash
+            return f"File {filename} already exists with same content.", pdf_bytes
 
         # Update hash in session state
         st.session_state.file_hashes[md_filename] = content_hash
 
-        # Append images to content as base64
-        for img_path in image_paths:
-            try:
-                # Read and encode image
-                image_data = get_resized_base64_image_src(img_path)
-                # Get image extension
-                ext = os.path.splitext(img_path)[1].lstrip('.')
-                # Add image to markdown content
-                content += f"\n\n<img src='{image_data}' style='width: 100%; page-break-before: always;'>\n"
-            except Exception as e:
-                st.warning(f"Failed to add image {img_path}: {str(e)}")
-                continue
+        # Append images to content, referenced by their resized copies in PDF_IMAGE_DIR
+        parts = [content]
+        # Resize the images concurrently, they are referenced by path relative to the PDF section root
+        encoded_images = _map_images(_resize_to_pdf_image, image_paths)
+        for img_path, image_data in zip(image_paths, encoded_images):
+            if isinstance(image_data, Exception):
+                st.warning(f"Error loading or resizing image: {image_data}")
+                image_data = get_base64_image_src(img_path)
+            # Add image to markdown content
+            parts.append(f"\n\n<img src='{image_data}' style='width: 100%; page-break-before: always;'>\n")
+        content = "".join(parts)
         
         # Write markdown content
         with open(md_filename, 'w', encoding='utf-8') as f:
@@ -94,517 +237,108 @@ def write_markdown_to_file(content: Annotated[str, "The markdown content to writ
         
         # Create PDF
         pdf = MarkdownPdf()
-        pdf.add_section(Section(content, toc=False))
-        pdf.save(pdf_filename)
+        pdf.add_section(Section(content, toc=False, root="."))
+        pdf.save(cached_pdf_filename)
+        with open(cached_pdf_filename, 'rb') as f:
+            pdf_bytes = f.read()
+        with open(pdf_filename, 'wb') as f:
+            f.write(pdf_bytes)
+
+        # Pruned only after the save, the new PDF may reference old resized images
+        _prune_oldest(glob.glob(f"{glob.escape(pdf_filename)}.*.pdf"), MAX_CACHED_PDFS)
+        _prune_oldest(glob.glob(f"{PDF_IMAGE_DIR}/*.jpg"), MAX_PDF_IMAGES)
         
-        return f"File {filename} has been created successfully."
+        return f"File {filename} has been created successfully.", pdf_bytes
         
     except Exception as e:
         st.error(f"Error writing file: {str(e)}")
-        return f"Error creating file {filename}: {str(e)}"
-
+        return f"Error creating file {filename}: {str(e)}", None
 
 
-def create_slideshow(image_paths, height=800):
-    # Ensure we have a list of image paths
-    if not isinstance(image_paths, list):
-        image_paths = [image_paths]
-    
-    # Take first 3 images from the list (or all if less than 3)
-    images = image_paths
-    
-    # Generate the slides HTML dynamically
-    slides_html = ""
-    dots_html = ""
-    
-    for i, img_path in enumerate(images, 1):
-        # Convert image to base64 for embedding directly in HTML
-        try:
-            with open(img_path, "rb") as img_file:
-                img_data = base64.b64encode(img_file.read()).decode()
-                img_src = f"data:image/png;base64,{img_data}"
-        except Exception as e:
-            st.warning(f"Error loading image {img_path}: {e}")
-            # Use the path directly as fallback
-            img_src = img_path
-            
-        slides_html += f"""
-        <div class="mySlides fade">
-            <div class="numbertext">{i} / {len(images)}</div>
-            <img src="{img_src}" class="slideshow-image" id="img-{i}" style="width:100%; height: auto; object-fit: contain;" onclick="openModal();currentModalSlide({i})">
-            <div class="text">Image {i}</div>
-        </div>
-        """
-        dots_html += f'<span class="dot" onclick="currentSlide({i})"></span> '
-
-    # Modal content for popup images
-    modal_content = ""
-    for i, img_path in enumerate(images, 1):
-        try:
-            with open(img_path, "rb") as img_file:
-                img_data = base64.b64encode(img_file.read()).decode()
-                img_src = f"data:image/png;base64,{img_data}"
-        except Exception as e:
-            img_src = img_path
-            
-        modal_content += f"""
-        <div class="modal-slides">
-            <img src="{img_src}" style="width:100%">
-        </div>
-        """
-
-    # Create the complete HTML with the dynamic content
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-    <meta name="viewport" content="width=device-width, initial-scale=1">
-    <style>
-    * {{box-sizing: border-box;}}
-    body {{font-family: Verdana, sans-serif; margin: 0;}}
-    .mySlides {{display: none;}}
-    img {{vertical-align: middle;}}
-
-    .slideshow-container {{
-        max-width: 1000px;
-        position: relative;
-        margin: 0 auto;
-        height: auto;
-    }}
-
-    .text {{
-        color: grey;
-        font-size: 15px;
-        padding: 8px 12px;
-        position: absolute;
-        bottom: 8px;
-        width: 100%;
-        text-align: center;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.5);
-    }}
-
-    .numbertext {{
-        color: grey;
-        font-size: 12px;
-        padding: 8px 12px;
-        position: absolute;
-        top: 0;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.5);
-    }}
-
-    .dot {{
-        height: 15px;
-        width: 15px;
-        margin: 0 1px;
-        background-color: #bbb;
-        border-radius: 50%;
-        display: inline-block;
-        transition: background-color 0.6s ease;
-        cursor: pointer;
-        margin-bottom: 0;
-        padding-bottom: 0;
-        margin-top: -10px; /* Adjusted to bring slightly up in position */
-    }}
-
-    .active, .dot:hover {{
-        background-color: #717171;
-    }}
-
-    .fade {{
-        animation-name: fade;
-        animation-duration: 0.5s;
-    }}
-
-    @keyframes fade {{
-        from {{opacity: .4}} 
-        to {{opacity: 1}}
-    }}
-    
-    /* Zoom feature */
-    .zoom-container {{
-        position: relative;
-        margin: auto;
-    }}
-    
-    .zoom-lens {{
-        position: absolute;
-        border: 0px solid #d4d4d4;
-        width: 60px;
-        height: 60px;
-        background-color: rgba(255, 255, 255, 0.4);
-        display: none;
-        pointer-events: none;
-    }}
-    
-    .zoom-result {{
-        position: absolute;
-        border: 1px solid #d4d4d4;
-        width: 200px;
-        height: 200px;
-        background-repeat: no-repeat;
-        display: none;
-        z-index: 999;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-        background-color: white;
-        overflow: visible;
-    }}
-    
-    /* Modal (background) */
-    .modal {{
-        display: none;
-        position: fixed;
-        z-index: 1000;
-        padding-top: 50px;
-        left: 0;
-        top: 0;
-        width: 100%;
-        height: 100%;
-        overflow: auto;
-        background-color: rgba(0,0,0,0.9);
-    }}
-
-    /* Modal Content */
-    .modal-content {{
-        position: relative;
-        margin: auto;
-        padding: 0;
-        width: 90%;
-        max-width: 1200px;
-    }}
-
-    /* The Close Button */
-    .close {{
-        color: white;
-        position: absolute;
-        top: 10px;
-        right: 25px;
-        font-size: 35px;
-        font-weight: bold;
-        transition: 0.3s;
-        z-index: 1001;
-    }}
-
-    .close:hover,
-    .close:focus {{
-        color: #999;
-        text-decoration: none;
-        cursor: pointer;
-    }}
-
-    /* Hide the slides by default */
-    .modal-slides {{
-        display: none;
-    }}
-
-    /* Next & previous buttons */
-    .prev,
-    .next {{
-        cursor: pointer;
-        position: absolute;
-        top: 50%;
-        width: auto;
-        padding: 16px;
-        margin-top: -50px;
-        color: white;
-        font-weight: bold;
-        font-size: 20px;
-        transition: 0.6s ease;
-        border-radius: 0 3px 3px 0;
-        user-select: none;
-        -webkit-user-select: none;
-        background-color: rgba(0,0,0,0.3);
-    }}
-
-    /* Position the "next button" to the right */
-    .next {{
-        right: 0;
-        border-radius: 3px 0 0 3px;
-    }}
-
-    /* On hover, add a black background color with a little bit see-through */
-    .prev:hover,
-    .next:hover {{
-        background-color: rgba(0,0,0,0.8);
-    }}
-    
-    /* Make images clickable */
-    .slideshow-image {{
-        cursor: pointer;
-    }}
-
-    /* Reduce dot container spacing */
-    div[style*="text-align:center"] {{
-        margin-top: 5px;
-        margin-bottom: 0;
-        padding-bottom: 0;
-    }}
-
-    /* Adjust dot spacing */
-    .dot {{
-        margin-bottom: 0;
-        padding-bottom: 0;
-        position: relative;
-        top: -80px;
-    }}
-    </style>
-    </head>
-    <body>
-
-    <div class="slideshow-container zoom-container">
-        <div class="zoom-lens" id="lens"></div>
-        <div class="zoom-result" id="result"></div>
-        {slides_html}
-    </div>
-    <br>
-
-    <div style="text-align:center">
-        {dots_html}
-    </div>
-    
-    <!-- The Modal/Lightbox -->
-    <div id="imageModal" class="modal">
-        <span class="close" onclick="closeModal()">&times;</span>
-        <div class="modal-content">
-            {modal_content}
-            
-            <a class="prev" onclick="plusModalSlides(-1)">&#10094;</a>
-            <a class="next" onclick="plusModalSlides(1)">&#10095;</a>
-        </div>
-    </div>
-
-    <script>
-    let slideIndex = 1;
-    let modalSlideIndex = 1;
-    showSlides(slideIndex);
-    
-    // Next/previous controls
-    function plusSlides(n) {{
-        showSlides(slideIndex += n);
-    }}
-    
-    // Thumbnail image controls
-    function currentSlide(n) {{
-        showSlides(slideIndex = n);
-    }}
-    
-    function showSlides(n) {{
-        let i;
-        let slides = document.getElementsByClassName("mySlides");
-        let dots = document.getElementsByClassName("dot");
-        if (n > slides.length) {{slideIndex = 1}}
-        if (n < 1) {{slideIndex = slides.length}}
-        for (i = 0; i < slides.length; i++) {{
-            slides[i].style.display = "none";
-        }}
-        for (i = 0; i < dots.length; i++) {{
-            dots[i].className = dots[i].className.replace(" active", "");
-        }}
-        slides[slideIndex-1].style.display = "block";
-        dots[slideIndex-1].className += " active";
-        
-        // Reset zoom for the new slide
-        setupZoom();
-    }}
-    
-    // Modal functions
-    function openModal() {{
-        document.getElementById("imageModal").style.display = "block";
-    }}
-    
-    function closeModal() {{
-        document.getElementById("imageModal").style.display = "none";
-    }}
-    
-    function plusModalSlides(n) {{
-        showModalSlides(modalSlideIndex += n);
-    }}
-    
-    function currentModalSlide(n) {{
-        showModalSlides(modalSlideIndex = n);
-    }}
-    
-    function showModalSlides(n) {{
-        let i;
-        let slides = document.getElementsByClassName("modal-slides");
-        if (n > slides.length) {{modalSlideIndex = 1}}
-        if (n < 1) {{modalSlideIndex = slides.length}}
-        for (i = 0; i < slides.length; i++) {{
-            slides[i].style.display = "none";
-        }}
-        slides[modalSlideIndex-1].style.display = "block";
-    }}
-    
-    // Close the modal when clicking outside of the image
-    window.onclick = function(event) {{
-        const modal = document.getElementById("imageModal");
-        if (event.target == modal) {{
-            closeModal();
-        }}
-    }}
-    
-    // Zoom functionality
-    function setupZoom() {{
-        const lens = document.getElementById("lens");
-        const result = document.getElementById("result");
-        const currentImage = document.querySelector(".mySlides:not([style*='display: none']) img");
-        
-        if (!currentImage) return;
-        
-        // Set up event listeners for the current image
-        currentImage.addEventListener("mousemove", moveLens);
-        currentImage.addEventListener("mouseenter", function() {{
-            lens.style.display = "block";
-            result.style.display = "block";
-        }});
-        currentImage.addEventListener("mouseleave", function() {{
-            lens.style.display = "none";
-            result.style.display = "none";
-        }});
-        
-        function moveLens(e) {{
-            let pos, x, y;
-            // Prevent any other actions that may occur
-            e.preventDefault();
-            // Get the cursor's x and y positions:
-            pos = getCursorPos(e);
-            // Calculate the position of the lens:
-            x = pos.x - (lens.offsetWidth / 4);
-            y = pos.y - (lens.offsetHeight / 4);
-            
-            // Prevent the lens from being positioned outside the image:
-            if (x > currentImage.width - lens.offsetWidth) {{x = currentImage.width - lens.offsetWidth;}}
-            if (x < 0) {{x = 0;}}
-            if (y > currentImage.height - lens.offsetHeight) {{y = currentImage.height - lens.offsetHeight;}}
-            if (y < 0) {{y = 0;}}
-            
-            // Set the position of the lens:
-            lens.style.left = x + "px";
-            lens.style.top = y + "px";
-            
-            // Position the result div relative to the cursor
-            result.style.left = (pos.x + 20) + "px";
-            result.style.top = (pos.y - 20) + "px";
-            
-            // Display what the lens "sees" with 50% reduced magnification
-            // Reduce the magnification by 50% by adjusting the cx and cy values
-            const cx = (result.offsetWidth / lens.offsetWidth) * 0.5; // Reduced by 50%
-            const cy = (result.offsetHeight / lens.offsetHeight) * 0.5; // Reduced by 50%
-            
-            result.style.backgroundImage = "url('" + currentImage.src + "')";
-            result.style.backgroundSize = (currentImage.width * cx) + "px " + (currentImage.height * cy) + "px";
-            result.style.backgroundPosition = "-" + (x * cx) + "px -" + (y * cy) + "px";
-        }}
-        
-        function getCursorPos(e) {{
-            let a, x = 0, y = 0;
-            e = e || window.event;
-            // Get the x and y positions of the image:
-            a = currentImage.getBoundingClientRect();
-            // Calculate the cursor's x and y coordinates, relative to the image:
-            x = e.pageX - a.left;
-            y = e.pageY - a.top;
-            // Consider any page scrolling:
-            x = x - window.pageXOffset;
-            y = y - window.pageYOffset;
-            return {{x : x, y : y}};
-        }}
-    }}
-    
-    // Initialize zoom for the first slide
-    document.addEventListener("DOMContentLoaded", function() {{
-        // Show first slide and set up zoom
-        showSlides(1);
-    }});
-    </script>
-
-    </body>
-    </html> 
-    """
 
-    # Display using streamlit components
-    components.html(html_content, height=height-50)
+def _file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
 
 
+# Slideshow page, its HTML, CSS and JS are served once as static component files and cached by the browser
+_slideshow_component = components.declare_component(
+    "slideshow", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "slideshow")
+)
 
 
-FIXED_CONTAINER_CSS = """
-div[data-testid="stVerticalBlockBorderWrapper"]:has(div.fixed-container-{id}):not(:has(div.not-fixed-container)){{
-    background-color: transparent;
-    position: {mode};
-    width: inherit;
-    background-color: inherit;
-    {position}: {margin};
-    z-index: 999;
-}}
-div[data-testid="stVerticalBlockBorderWrapper"]:has(div.fixed-container-{id}):not(:has(div.not-fixed-container)) div[data-testid="stVerticalBlock"]:has(div.fixed-container-{id}):not(:has(div.not-fixed-container)) > div[data-testid="element-container"] {{
-    display: none;
-}}
-div[data-testid="stVerticalBlockBorderWrapper"]:has(div.not-fixed-container):not(:has(div[class^='fixed-container-'])) {{
-    display: none;
-}}
-""".strip()
+# Preview images are served by Streamlit's static file handler, see server.enableStaticServing
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+PREVIEW_DIR = os.path.join(STATIC_DIR, "_previews")
 
-MARGINS = {
-    "top": "2.875rem",
-    "bottom": "60px",
-}
+def _static_url(relative_path):
+    """URL of a file under STATIC_DIR, honouring server.baseUrlPath."""
+    base_path = st.get_option("server.baseUrlPath").strip("/")
+    return f"{'/' + base_path if base_path else ''}/app/static/{relative_path}"
 
-def st_fixed_container(
-    *,
-    height = None,
-    border = None,
-    mode = "fixed",
-    position = "top",
-    margin = None,
-    key = None,
-):
-    if margin is None:
-        margin = MARGINS[position]
-    global fixed_counter
-    fixed_container = st.container()
-    non_fixed_container = st.container()
-    css = FIXED_CONTAINER_CSS.format(
-        mode=mode,
-        position=position,
-        margin=margin,
-        id=key,
-    )
-    with fixed_container:
-        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
-        st.markdown(
-            f"<div class='fixed-container-{key}'></div>",
-            unsafe_allow_html=True,
-        )
-    with non_fixed_container:
-        st.markdown(
-            f"<div class='not-fixed-container'></div>",
-            unsafe_allow_html=True,
-        )
-
-    with fixed_container:
-        # Only pass height if it's not None (Streamlit doesn't accept None for height)
-        if height is not None:
-            return st.container(height=height, border=border)
-        else:
-            return st.container(border=border)
+def _publish_preview(img_path):
+    """
+    Link an image into the static folder and return its URL, so the browser
+    downloads and caches the file instead of receiving it base64 encoded.
+    The name covers the path, mtime and size, so a changed image gets a new URL.
+    """
+    source = os.path.abspath(img_path)
+    stat = os.stat(source)
+    key = hashlib.blake2b(f"{source}\0{stat.st_mtime_ns}\0{stat.st_size}".encode(), digest_size=16).hexdigest()
+    name = key + os.path.splitext(source)[1].lower()
+    target = os.path.join(PREVIEW_DIR, name)
+    if not os.path.exists(target):
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            # Different filesystem or no hardlink support
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+    return _static_url(f"_previews/{name}")
+
+@st.cache_data(max_entries=64)
+def _slideshow_sources(images: Tuple[str, ...], mtimes: Tuple[Optional[float], ...]) -> List[str]:
+    """
+    Resolve the slideshow image URLs. Cached across reruns, the mtimes are only
+    part of the cache key so regenerated images are published again.
+    """
+    image_sources = []
+    for img_path in images:
+        try:
+            img_src = _publish_preview(img_path)
+        except Exception as e:
+            st.warning(f"Error serving image {img_path}: {e}")
+            try:
+                img_src = _encode_png_data_uri(img_path)
+            except Exception:
+                # Use the path directly as fallback
+                img_src = img_path
+        image_sources.append(img_src)
+    return image_sources
 
 
-def download_button(object_to_download, download_filename, button_text, document_path):
+def create_slideshow(image_paths, height=800, key=None):
+    # Ensure we have a list of image paths
+    if not isinstance(image_paths, list):
+        image_paths = [image_paths]
 
-    with st.spinner("Generating PDF..."):
-        write_markdown_to_file(object_to_download, download_filename, document_path)
+    images = tuple(image_paths)
+    mtimes = tuple(_file_mtime(img_path) for img_path in images)
+    image_sources = _slideshow_sources(images, mtimes)
 
-    with open(download_filename.replace("assets", ""), "rb") as pdf_file:
-        pdf_bytes = pdf_file.read()
+    # Display using the slideshow component, only the image URLs travel per rerun
+    _slideshow_component(images=image_sources, height=height-50, key=key, default=None)
 
-    button_uuid = str(uuid.uuid4()).replace('-', '')
-    button_id = re.sub('\d+', '', button_uuid)
 
-    b64 = base64.b64encode(pdf_bytes).decode()
+_DIGITS_RE = re.compile(r'\d+')
 
-    custom_css = f""" 
+_DOWNLOAD_BUTTON_CSS = string.Template(""" 
         <style>
-            #{button_id} {{
+            #$button_id {
                 background-color: rgb(255, 255, 255);
                 color: rgb(38, 39, 48);
                 padding: 0.25em 0.38em;
@@ -615,17 +349,29 @@ def download_button(object_to_download, download_filename, button_text, document
                 border-style: solid;
                 border-color: rgb(230, 234, 241);
                 border-image: initial;
-            }} 
-            #{button_id}:hover {{
+            } 
+            #$button_id:hover {
                 border-color: rgb(246, 51, 102);
                 color: rgb(246, 51, 102);
-            }}
-            #{button_id}:active {{
+            }
+            #$button_id:active {
                 box-shadow: none;
                 background-color: rgb(246, 51, 102);
                 color: white;
-                }}
-        </style> """
+                }
+        </style> """)
+
+
+def download_button(object_to_download, download_filename, button_text, document_path):
+
+    with st.spinner("Generating PDF..."):
+        _, pdf_bytes = write_markdown_to_file(object_to_download, download_filename, document_path)
+
+    button_id = _DIGITS_RE.sub('', uuid.uuid4().hex)
+
+    b64 = b64encode_str(pdf_bytes or b"")
+
+    custom_css = _DOWNLOAD_BUTTON_CSS.substitute(button_id=button_id)
 
     dl_link = custom_css + f'<a download="{download_filename.replace("assets", "")}" id="{button_id}" href="data:file/txt;base64,{b64}">{button_text}</a><br></br>'
 
@@ -643,12 +389,36 @@ def load_image(image_path):
 @st.cache_data
 def load_pdf_as_base64(pdf_path):
     try:
-        with open(pdf_path.replace("assets", ""), "rb") as f:
-            return base64.b64encode(f.read()).decode()
+        return b64encode_file(pdf_path.replace("assets", ""))
     except Exception as e:
         st.error(f"Error loading PDF: {e}")
         return None
 
+# Define metric categories and their display order
+METRIC_CATEGORIES = {
+    "🎯 Credit Rating": ["Rating", "Outlook"],
+    "📈 GDP Performance": ["GDP Growth", "GDP Projection", "Past Five Years Average"],
+    "💰 Financial Indicators": ["Inflation", "Foreign Reserves", "Import Cover"],
+    "🚢 Export Performance": ["Export Earnings", "Export Growth"],
+    "📦 Key Exports": ["Key Commodity Exports"],
+    "👥 Government Statistics": ["Government Capital Spending"],
+    "⚠️ Risk Factors": ["Economic Constraints"],
+    "🏭 Major Industries": ["Major Industries"]
+}
+
+# Lowercased substrings matched against metric names, per category
+_METRIC_CATEGORY_NEEDLES = {
+    category: tuple(metric_key.lower() for metric_key in metric_keys)
+    for category, metric_keys in METRIC_CATEGORIES.items()
+}
+
+def parse_metrics(metrics_dict):
+    """Parse a metrics string as JSON, or as a Python dict repr which the agent sometimes returns instead."""
+    try:
+        return json_loads(metrics_dict)
+    except ValueError:
+        return ast.literal_eval(metrics_dict)
+
 def display_metrics(metrics_dict):
     """
     Display metrics in rows with expandable sections
@@ -691,8 +461,8 @@ def display_metrics(metrics_dict):
         # Parse metrics if it's a string
         if isinstance(metrics_dict, str):
             try:
-                metrics = json.loads(metrics_dict.replace("'", '"'))
-            except json.JSONDecodeError as e:
+                metrics = parse_metrics(metrics_dict)
+            except (ValueError, SyntaxError) as e:
                 st.error(f"Failed to parse metrics data: Invalid JSON format\nError: {str(e)}")
                 return
         elif isinstance(metrics_dict, dict):
@@ -705,26 +475,17 @@ def display_metrics(metrics_dict):
             st.info("No metrics data available")
             return
 
-        # Define metric categories and their display order
-        metric_categories = {
-            "🎯 Credit Rating": ["Rating", "Outlook"],
-            "📈 GDP Performance": ["GDP Growth", "GDP Projection", "Past Five Years Average"],
-            "💰 Financial Indicators": ["Inflation", "Foreign Reserves", "Import Cover"],
-            "🚢 Export Performance": ["Export Earnings", "Export Growth"],
-            "📦 Key Exports": ["Key Commodity Exports"],
-            "👥 Government Statistics": ["Government Capital Spending"],
-            "⚠️ Risk Factors": ["Economic Constraints"],
-            "🏭 Major Industries": ["Major Industries"]
-        }
+        # Lowercase every metric name once for all the category checks
+        lowered_keys = [(key, key.lower()) for key in metrics]
 
         # Display metrics by category in rows
-        for category, metric_keys in metric_categories.items():
+        for category, needles in _METRIC_CATEGORY_NEEDLES.items():
             with st.expander(category, expanded=True):
                 # For metrics that match this category
-                matching_metrics = []
-                for key in metrics.keys():
-                    if any(metric_key.lower() in key.lower() for metric_key in metric_keys):
-                        matching_metrics.append((key, metrics[key]))
+                matching_metrics = [
+                    (key, metrics[key]) for key, lowered in lowered_keys
+                    if any(needle in lowered for needle in needles)
+                ]
                 
                 if matching_metrics:
                     # Create appropriate number of columns based on metrics count
@@ -782,20 +543,10 @@ def display_metrics(metrics_dict):
         st.error("Problematic metrics data:")
         st.code(str(metrics_dict))
 
-# Create a new event loop for async operations
 def get_agent_response(user_query):
     try:
-        # Create a new event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Run the agent in the new event loop
-        response = run_agent(user_query)
-        
-        # Close the loop
-        loop.close()
-        
-        return response
+        # Runs on the agent module's own event loop, shared by every session
+        return run_agent_sync(user_query)
     except Exception as e:
         st.error(f"Error in agent response: {str(e)}")
         return None
@@ -808,327 +559,94 @@ def set_page_config():
         layout="wide"
     )
     
-    # Add custom CSS for the logo and header
-    st.markdown("""
-        <style>
-        /* Hide default Streamlit header */
-        header[data-testid="stHeader"] {
-            display: none;
-        }
-        
-        /* Remove default margins and padding */
-        .block-container {
-            padding-top: 0 !important;
-            padding-bottom: 0 !important;
-            margin-top: 0 !important;
-        }
-        
-        [data-testid="stAppViewContainer"] {
-            padding-top: 0 !important;
-            overflow: hidden !important;
-        }
+    # Add all custom CSS in one go, st.html skips the markdown pipeline and adds no whitespace
+    st.html(ALL_CSS)
 
-        section[data-testid="stSidebar"] {
-            margin-top: 90px !important;
-        }
-        
-        /* Frosted glass header */
-        .logo-container {
-            position: fixed;
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            padding: 1.5rem 3rem;
-            background: rgba(255, 255, 255, 0.7) !important;
-            backdrop-filter: blur(10px) !important;
-            -webkit-backdrop-filter: blur(10px) !important;
-            margin: 0;
-            width: 100vw;
-            height: 90px;
-            left: 50%;
-            right: 50%;
-            margin-left: -50vw;
-            margin-right: -50vw;
-            border-bottom: 1px solid rgba(255, 255, 255, 0.3);
-            box-shadow: 0 4px 30px rgba(0, 0, 0, 0.1);
-            top: 0;
-            z-index: 1000;
-        }
-        
-        /* Left section with Agusto logo and title */
-        .left-section {
-            display: flex;
-            align-items: center;
-        }
-        
-        .agusto-logo {
-            height: 60px;
-            margin-right: 20px;
-            object-fit: contain;
-        }
-        
-        /* Right section with Vizyx logo and powered by text */
-        .right-section {
-            display: flex;
-            flex-direction: column;
-            align-items: flex-end;
-            justify-content: center;
-        }
-        
-        .vizyx-logo {
-            height: 40px;
-            object-fit: contain;
-            margin-bottom: 4px;
-        }
-        
-        .powered-by {
-            color: #666;
-            font-size: 12px;
-            margin: 0;
-            padding: 0;
-        }
-
-        /* Frosted glass footer */
-        .footer-container {
-            position: fixed;
-            bottom: 0;
-            left: 0;
-            right: 0;
-            background: rgba(255, 255, 255, 0.1) !important;
-            backdrop-filter: blur(10px) !important;
-            -webkit-backdrop-filter: blur(10px) !important;
-            padding: 1rem 1rem;
-            border-top: 1px solid rgba(255, 255, 255, 0.3);
-            box-shadow: 0 -4px 30px rgba(0, 0, 0, 0.1);
-            z-index: 1000;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-
-        .footer-text {
-            color: rgba(0, 0, 0, 0.7);
-            font-size: 0.8rem;
-        }
-
-        /* Adjust main content to account for footer */
-        .main-content {
-            padding-top: 90px !important;
-            padding-bottom: 60px !important;
-            margin-top: 0 !important;
-        }
-
-        /* Prevent horizontal scroll */
-        body {
-            overflow-x: hidden !important;
-        }
-
-        .title-container {
-            flex-grow: 1;
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            gap: 2px;  /* Reduced spacing between title and subtitle */
-        }
-        
-        .main-title {
-            color: #2a1f5f;
-            font-size: 24px;
-            margin: 0;
-            padding: 0;
-            font-weight: bold;
-            line-height: 1;  /* Reduced line height */
-        }
+@st.fragment
+def _render_history():
+    """
+    Render the chat history as a fragment, so interactions inside a past
+    message rerun only the history instead of the whole page.
+    """
+    for idx, chat in enumerate(reversed(st.session_state.chat_history)):
+        # User message
+        with st.chat_message("user"):
+            st.write(chat["query"])
         
-        .sub-title {
-            color: #4f4f4f;
-            font-size: 16px;
-            margin: 2px 0 0 0;  /* Reduced top margin */
-            padding: 0;
-            line-height: 1;  /* Reduced line height */
-        }
-
-        /* Gradient background for the entire app */
-        .stApp {
-            background: linear-gradient(135deg, 
-                #f5f7fa 10%, 
-                #e8edf5 35%, 
-                #e0e9f0 60%, 
-                #d8e5eb 85%, 
-                #d0e1e6 100%) !important;
-            background-attachment: fixed !important;
-        }
-
-        /* Make main content area transparent to show gradient */
-        [data-testid="stAppViewContainer"] {
-            background: transparent !important;
-        }
-
-        /* Chat message styling with semi-transparent background */
-        [data-testid="stChatMessage"] {
-            border: 1px solid rgba(220, 220, 220, 0.8);
-            border-radius: 10px;
-            padding: 1rem;
-            margin: 1rem 0;
-            background-color: rgba(255, 255, 255, 0.7) !important;
-            backdrop-filter: blur(10px);
-            -webkit-backdrop-filter: blur(10px);
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-
-        /* Style user messages */
-        [data-testid="stChatMessage"][data-testid="user"] {
-            border-left: 4px solid #0066cc;
-            background-color: rgba(255, 255, 255, 0.7) !important;
-        }
-
-        /* Style assistant messages */
-        [data-testid="stChatMessage"][data-testid="assistant"] {
-            border-left: 4px solid #00cc88;
-            background-color: rgba(255, 255, 255, 0.7) !important;
-            margin-top: 0.5rem; /* Reduced top margin by 50% */
-        }
-
-        /* Style columns inside chat messages */
-        [data-testid="stChatMessage"] > div > div > div > div[data-testid="column"] {
-            background-color: rgba(250, 250, 250, 0.3) !important;
-            padding: 1rem;
-            border-radius: 8px;
-        }
-
-        /* Style metrics section */
-        [data-testid="stChatMessage"] .stMetric {
-            background-color: rgba(255, 255, 255, 0.7) !important;
-            padding: 0.5rem;
-            border-radius: 5px;
-            border: 1px solid rgba(240, 240, 240, 0.5);
-        }
-
-        /* Style document preview section */
-        [data-testid="stChatMessage"] img {
-            border: 1px solid rgba(0, 0, 0, 0.5);
-            border-radius: 10px;
-        }
-
-        /* Style sidebar with gradient */
-        [data-testid="stSidebar"] {
-            background: linear-gradient(180deg, 
-                rgba(255, 255, 255, 0.9) 0%, 
-                rgba(255, 255, 255, 0.8) 100%) !important;
-            backdrop-filter: blur(10px);
-            -webkit-backdrop-filter: blur(10px);
-        }
-
-        /* Keep header solid */
-        .logo-container {
-            background-color: white !important;
-            border-bottom: 1px solid rgba(229, 229, 229, 0.5);
-        }
-
-        /* Style chat input container */
-        .stChatInputContainer {
-            background-color: rgba(255, 0, 0, 1) !important;
-            border-radius: 10px;
-            padding: 1rem;
-            backdrop-filter: blur(5px);
-            -webkit-backdrop-filter: blur(5px);
-        }
-
-        /* Add spacing between sections */
-        [data-testid="stChatMessage"] .stMarkdown {
-            margin-bottom: 1rem;
-        }
+        # Assistant response
+        with st.chat_message("assistant"):
+            try:
+                # Create two columns: one for content, one for document preview
+                col1, col2 = st.columns([5, 3])
+                
+                with col1:
+                    # Display markdown report with unique key
+                    st.markdown(chat["clean_markdown"])
+                    
 
-        /* Ensure text remains readable */
-        .stMarkdown {
-            color: #1f1f1f !important;
-        }
+                    st.markdown("--------------------------------")
+                    
+                    st.markdown("\n\n\n\n\n")
+                
+                with col2:
+                    # Display document preview with error handling
+                    st.subheader("Document Preview")
+                    if chat["response"].document_path:
+                        try:
+                            with st.container():
 
-        /* Enhanced frosted glass effect for both header and footer */
-        .glass-effect {
-            background: rgba(255, 255, 255, 0.7) !important;
-            backdrop-filter: blur(10px) saturate(100%) !important;
-            -webkit-backdrop-filter: blur(10px) saturate(100%) !important;
-            border: 1px solid rgba(255, 255, 255, 0.3) !important;
-            box-shadow: 0 4px 30px rgba(0, 0, 0, 0.1) !important;
-        }
+                                image_paths = chat["response"].document_path
+                                create_slideshow(image_paths, height=1000, key=f"slideshow-{chat['timestamp']}")  # Increased height to accommodate dots
+                        except Exception as e:
+                            st.info(f"No document preview available")
 
-        /* Footer styling */
-        .footer-content {
-            position: fixed !important;
-            bottom: 15px !important;
-            left: 0 !important;
-            right: 0 !important;
-            height: 30px !important;
-            display: flex !important;
-            justify-content: space-between !important;
-            align-items: center !important;
-            padding: 0.3rem 3rem !important;
-            font-size: 0.75rem !important;
-            color: rgba(0, 0, 0, 0.6) !important;
-            z-index: 998 !important;
-            background: none !important;
-        }
+            
+            except Exception as e:
+                st.warning(f"""
+                Error displaying chat response
+                Error type: {type(e).__name__}
+                Error details: {str(e)}
+                """
+                )
+        st.markdown("--------------------------------")
 
-        /* Style the chat input container */
-        .stChatInputContainer {
-            padding: 10px;
-        }
-        
-        /* Style the chat input box */
-        .stChatInput {
-            border: 1px solid grey !important;
-            border-radius: 8px !important;
-        }
-        
-        /* Style the chat input when focused */
-        .stChatInput:focus {
-            border: 1px solid grey !important;
-            box-shadow: none !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+@st.cache_resource(show_spinner=False)
+def _conversion_executor():
+    """
+    Worker that runs PDF conversion off the script thread. Cached as a resource
+    so every rerun and session shares the one executor of the server process.
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-conversion")
 
-def get_base64_encoded_image(image_path):
-    """Get base64 encoded image"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode()
+def _render_conversion_controls():
+    """
+    Sidebar button that starts converting documents/ to page images in the
+    background, the status is refreshed on the next rerun.
+    """
+    with st.sidebar:
+        conversion = st.session_state.get("pdf_conversion")
+        running = conversion is not None and not conversion.done()
+        if st.button("Convert PDFs to images", disabled=running):
+            conversion = st.session_state.pdf_conversion = _conversion_executor().submit(convert_pdf_to_images)
+            running = True
+
+        if conversion is None:
+            return
+        if running:
+            st.status("Converting PDFs...", state="running", expanded=False)
+        elif conversion.exception() is not None:
+            st.status("PDF conversion failed", state="error").write(str(conversion.exception()))
+        else:
+            st.status("PDF conversion complete", state="complete", expanded=False)
 
 def main():
     # Set page configuration and styling
     set_page_config()
     
-    # Display header with both logos
-    agusto_logo_path = "assets/vizyx_logo.png"
-    vizyx_logo_path = "assets/vizyx_logo.png"
-    
-    # Header HTML
-    header_html = f"""
-        <div class="logo-container glass-effect">
-            <div class="left-section">
-                <img src="data:image/jpg;base64,{get_base64_encoded_image(agusto_logo_path)}" alt="Agusto Logo" class="agusto-logo"/>
-                <div class="title-container">
-                    <h2 class="main-title">Research Agent</h2>
-                    <p class="sub-title">AI-Powered Research</p>
-                </div>
-            </div>
-            <div class="right-section">
-                <img src="data:image/png;base64,{get_base64_encoded_image(vizyx_logo_path)}" alt="Vizyx Logo" class="vizyx-logo"/>
-                <p class="powered-by">Powered by Vizyx</p>
-            </div>
-        </div>
-        <div class="main-content">
-    """
-
-    # Footer HTML
-    footer_html = f"""
-        <div class="footer-content">
-            <span>© {datetime.now().year} Vizyx Ltd. All rights reserved. For demonstration purposes only.</span>
-        </div>
-    """
-
     # Display header and footer
-    st.markdown(header_html, unsafe_allow_html=True)
+    st.markdown(header_html(_static_url("vizyx_logo.png")), unsafe_allow_html=True)
+
+    _render_conversion_controls()
     
     # Initialize session state for chat history
     if "chat_history" not in st.session_state:
@@ -1136,74 +654,6 @@ def main():
 
     st.title("Knowledge Base Agent")
     st.write("Welcome to the Knowledge Base Agent - Agent for Knowledge Base Analysis")
-
-    # Fixed chat input at bottom - responsive design
-    st.markdown("""
-        <style>
-        /* Fixed chat input container at bottom */
-        .stChatInput {
-            position: fixed !important;
-            bottom: 70px !important;
-            left: 50% !important;
-            transform: translateX(-50%) !important;
-            width: 90% !important;
-            max-width: 800px !important;
-            z-index: 1000 !important;
-            background: rgba(255, 255, 255, 0.95) !important;
-            backdrop-filter: blur(10px) !important;
-            -webkit-backdrop-filter: blur(10px) !important;
-            border-radius: 12px !important;
-            border: 1px solid rgba(0, 0, 0, 0.1) !important;
-            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.15) !important;
-            padding: 8px 16px !important;
-            box-sizing: border-box !important;
-        }
-        
-        /* Responsive adjustments for different screen sizes */
-        @media (min-width: 768px) {
-            .stChatInput {
-                width: 80% !important;
-                max-width: 900px !important;
-            }
-        }
-        
-        @media (min-width: 1200px) {
-            .stChatInput {
-                width: 60% !important;
-                max-width: 1000px !important;
-            }
-        }
-        
-        @media (min-width: 1600px) {
-            .stChatInput {
-                width: 50% !important;
-                max-width: 1000px !important;
-            }
-        }
-        
-        /* Add padding to bottom of main content to prevent overlap */
-        .main .block-container {
-            padding-bottom: 140px !important;
-        }
-        
-        /* Style the chat input textarea */
-        .stChatInput textarea {
-            border: none !important;
-            background: transparent !important;
-            width: 100% !important;
-        }
-        
-        .stChatInput textarea:focus {
-            box-shadow: none !important;
-            outline: none !important;
-        }
-        
-        /* Ensure the input container doesn't overflow */
-        .stChatInput > div {
-            width: 100% !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
     
     user_query = st.chat_input("Enter your query")
 
@@ -1222,116 +672,31 @@ def main():
                         try:
                             # Test parsing of metrics_dict
                             if isinstance(response.metrics_dict, str):
-                                json.loads(response.metrics_dict.replace("'", '"'))
-                        except json.JSONDecodeError as e:
+                                parse_metrics(response.metrics_dict)
+                        except (ValueError, SyntaxError) as e:
                             st.warning(f"Invalid metrics format in response: {str(e)}")
                             response.metrics_dict = "{}"  # Set empty metrics if invalid
                     else:
                         st.warning("Response missing metrics_dict attribute")
                         response.metrics_dict = "{}"
 
-                    # Add to chat history (new messages at the beginning)
-                    st.session_state.chat_history.insert(0, {
+                    # Add to chat history, it is displayed newest first
+                    st.session_state.chat_history.append({
                         "query": user_query,
                         "response": response,
+                        # Strip the logo once here instead of on every rerender
+                        "clean_markdown": response.markdown_report.replace("![](assets/vizyx_logo.png)", ""),
                         "timestamp": datetime.now().isoformat()  # Add timestamp for unique keys
                     })
-                    # Trigger rerun to update the UI
-                    st.rerun()
+                    # The history is rendered below in this same run, no st.rerun() needed
             except Exception as e:
                 st.error(f"Error processing query: {str(e)}")
 
     # Display chat history
-    for idx, chat in enumerate(st.session_state.chat_history):
-        # User message
-        with st.chat_message("user"):
-            st.write(chat["query"])
-        
-        # Assistant response
-        with st.chat_message("assistant"):
-            try:
-                # Create two columns: one for content, one for document preview
-                col1, col2 = st.columns([5, 3])
-                
-                with col1:
-                    # Display markdown report with unique key
-                    st.markdown(
-                        chat["response"].markdown_report.replace("![](assets/vizyx_logo.png)", "")
-                    )
-                    
-
-                    st.markdown("--------------------------------")
-                    
-                    st.markdown("\n\n\n\n\n")
-                
-                with col2:
-                    # Display document preview with error handling
-                    st.subheader("Document Preview")
-                    if chat["response"].document_path:
-                        try:
-                            with st.container():
-                                st.markdown("""
-                                    <style>
-                                        .document-preview {
-                                            max-height: 1000px;
-                                            overflow-y: auto;
-                                            padding: 2px;
-                                            margin-bottom: 0;
-                                        }
-                                        .stSubheader {
-                                            margin-bottom: 0 !important;
-                                            padding-bottom: 0 !important;
-                                        }
-                                        /* Adjust slideshow container height and spacing */
-                                        .slideshow-container {
-                                            height: auto !important;
-                                            min-height: 800px !important;
-                                            margin-bottom: 40px !important; /* Add space for dots */
-                                            position: relative;
-                                        }
-                                        /* Ensure images fill the container */
-                                        .slideshow-image {
-                                            height: 800px !important;
-                                            width: 100% !important;
-                                            object-fit: contain !important;
-                                        }
-                                        /* Fix dots container position */
-                                        .dots-container {
-                                            position: absolute;
-                                            bottom: -30px;
-                                            left: 0;
-                                            right: 0;
-                                            text-align: center;
-                                            background: rgba(255, 255, 255, 0.8);
-                                            padding: 5px 0;
-                                            z-index: 100;
-                                        }
-                                        /* Style the dots */
-                                        .dot {
-                                            position: static !important;
-                                            top: auto !important;
-                                            margin: 0 4px !important;
-                                        }
-                                    </style>
-                                """, unsafe_allow_html=True)
-
-                                image_paths = chat["response"].document_path
-                                create_slideshow(image_paths, height=1000)  # Increased height to accommodate dots
-                        except Exception as e:
-                            st.info(f"No document preview available")
-
-            
-            except Exception as e:
-                st.warning(f"""
-                Error displaying chat response
-                Error type: {type(e).__name__}
-                Error details: {str(e)}
-                """
-                )
-        st.markdown("--------------------------------")
+    _render_history()
 
     # Display footer at the end
-    st.markdown(footer_html, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
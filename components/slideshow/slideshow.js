@@ -0,0 +1,225 @@
+let slideIndex = 1;
+let modalSlideIndex = 1;
+let renderedImages = [];
+
+// Streamlit component protocol, the page is loaded once and re-rendered through messages
+function sendMessage(type, data) {
+    window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+}
+
+function sameImages(images) {
+    return images.length === renderedImages.length && images.every((src, i) => src === renderedImages[i]);
+}
+
+// Give a lazily rendered image its source
+function loadImage(image) {
+    if (!image.src && image.dataset.src) {
+        image.src = image.dataset.src;
+    }
+    return image;
+}
+
+// Build the slides, dots and modal slides for a list of image sources
+function renderSlides(images) {
+    const slides = document.getElementById("slides");
+    const dots = document.getElementById("dots");
+    const modalSlides = document.getElementById("modal-slides");
+    slides.querySelectorAll(".mySlides").forEach(slide => slide.remove());
+    dots.replaceChildren();
+    modalSlides.replaceChildren();
+
+    images.forEach((src, index) => {
+        const n = index + 1;
+        const slide = document.createElement("div");
+        slide.className = "mySlides fade";
+        const number = document.createElement("div");
+        number.className = "numbertext";
+        number.textContent = n + " / " + images.length;
+        const image = document.createElement("img");
+        // Only the first slide decodes up front, the others get their source when shown
+        if (n === 1) {
+            image.src = src;
+        } else {
+            image.dataset.src = src;
+            image.loading = "lazy";
+        }
+        image.className = "slideshow-image";
+        image.id = "img-" + n;
+        image.style.cssText = "width:100%; height: auto; object-fit: contain;";
+        image.onclick = function() { openModal(); currentModalSlide(n); };
+        const caption = document.createElement("div");
+        caption.className = "text";
+        caption.textContent = "Image " + n;
+        slide.append(number, image, caption);
+        slides.append(slide);
+
+        const dot = document.createElement("span");
+        dot.className = "dot";
+        dot.onclick = function() { currentSlide(n); };
+        dots.append(dot, " ");
+
+        // Modal sources are copied from the slides when opened
+        const modalSlide = document.createElement("div");
+        modalSlide.className = "modal-slides";
+        const modalImage = document.createElement("img");
+        modalImage.style.width = "100%";
+        modalSlide.append(modalImage);
+        modalSlides.append(modalSlide);
+    });
+    renderedImages = images;
+}
+
+window.addEventListener("message", function(event) {
+    if (event.data.type !== "streamlit:render") return;
+    const args = event.data.args;
+    // Reruns resend the same images, only rebuild the DOM when they change
+    if (!sameImages(args.images)) {
+        renderSlides(args.images);
+        showSlides(slideIndex = 1);
+    }
+    sendMessage("streamlit:setFrameHeight", {height: args.height});
+});
+
+// Next/previous controls
+function plusSlides(n) {
+    showSlides(slideIndex += n);
+}
+
+// Thumbnail image controls
+function currentSlide(n) {
+    showSlides(slideIndex = n);
+}
+
+function showSlides(n) {
+    let i;
+    let slides = document.getElementsByClassName("mySlides");
+    let dots = document.getElementsByClassName("dot");
+    if (n > slides.length) {slideIndex = 1}
+    if (n < 1) {slideIndex = slides.length}
+    for (i = 0; i < slides.length; i++) {
+        slides[i].style.display = "none";
+    }
+    for (i = 0; i < dots.length; i++) {
+        dots[i].className = dots[i].className.replace(" active", "");
+    }
+    if (!slides.length) return;
+    loadImage(slides[slideIndex-1].querySelector("img"));
+    slides[slideIndex-1].style.display = "block";
+    dots[slideIndex-1].className += " active";
+
+    // Reset zoom for the new slide
+    setupZoom();
+}
+
+// Modal functions
+function openModal() {
+    document.getElementById("imageModal").style.display = "block";
+}
+
+function closeModal() {
+    document.getElementById("imageModal").style.display = "none";
+}
+
+function plusModalSlides(n) {
+    showModalSlides(modalSlideIndex += n);
+}
+
+function currentModalSlide(n) {
+    showModalSlides(modalSlideIndex = n);
+}
+
+function showModalSlides(n) {
+    let i;
+    let slides = document.getElementsByClassName("modal-slides");
+    if (n > slides.length) {modalSlideIndex = 1}
+    if (n < 1) {modalSlideIndex = slides.length}
+    for (i = 0; i < slides.length; i++) {
+        slides[i].style.display = "none";
+    }
+    slides[modalSlideIndex-1].style.display = "block";
+
+    // Reuse the slide's encoded image instead of shipping a second copy
+    let modalImage = slides[modalSlideIndex-1].querySelector("img");
+    if (!modalImage.src) {
+        modalImage.src = loadImage(document.getElementById("img-" + modalSlideIndex)).src;
+    }
+}
+
+// Close the modal when clicking outside of the image
+window.onclick = function(event) {
+    const modal = document.getElementById("imageModal");
+    if (event.target == modal) {
+        closeModal();
+    }
+}
+
+// Zoom functionality
+function setupZoom() {
+    const lens = document.getElementById("lens");
+    const result = document.getElementById("result");
+    const currentImage = document.querySelector(".mySlides:not([style*='display: none']) img");
+
+    if (!currentImage) return;
+
+    // Set up event listeners for the current image
+    currentImage.addEventListener("mousemove", moveLens);
+    currentImage.addEventListener("mouseenter", function() {
+        lens.style.display = "block";
+        result.style.display = "block";
+    });
+    currentImage.addEventListener("mouseleave", function() {
+        lens.style.display = "none";
+        result.style.display = "none";
+    });
+
+    function moveLens(e) {
+        let pos, x, y;
+        // Prevent any other actions that may occur
+        e.preventDefault();
+        // Get the cursor's x and y positions:
+        pos = getCursorPos(e);
+        // Calculate the position of the lens:
+        x = pos.x - (lens.offsetWidth / 4);
+        y = pos.y - (lens.offsetHeight / 4);
+
+        // Prevent the lens from being positioned outside the image:
+        if (x > currentImage.width - lens.offsetWidth) {x = currentImage.width - lens.offsetWidth;}
+        if (x < 0) {x = 0;}
+        if (y > currentImage.height - lens.offsetHeight) {y = currentImage.height - lens.offsetHeight;}
+        if (y < 0) {y = 0;}
+
+        // Set the position of the lens:
+        lens.style.left = x + "px";
+        lens.style.top = y + "px";
+
+        // Position the result div relative to the cursor
+        result.style.left = (pos.x + 20) + "px";
+        result.style.top = (pos.y - 20) + "px";
+
+        // Display what the lens "sees" with 50% reduced magnification
+        // Reduce the magnification by 50% by adjusting the cx and cy values
+        const cx = (result.offsetWidth / lens.offsetWidth) * 0.5; // Reduced by 50%
+        const cy = (result.offsetHeight / lens.offsetHeight) * 0.5; // Reduced by 50%
+
+        result.style.backgroundImage = "url('" + currentImage.src + "')";
+        result.style.backgroundSize = (currentImage.width * cx) + "px " + (currentImage.height * cy) + "px";
+        result.style.backgroundPosition = "-" + (x * cx) + "px -" + (y * cy) + "px";
+    }
+
+    function getCursorPos(e) {
+        let a, x = 0, y = 0;
+        e = e || window.event;
+        // Get the x and y positions of the image:
+        a = currentImage.getBoundingClientRect();
+        // Calculate the cursor's x and y coordinates, relative to the image:
+        x = e.pageX - a.left;
+        y = e.pageY - a.top;
+        // Consider any page scrolling:
+        x = x - window.pageXOffset;
+        y = y - window.pageYOffset;
+        return {x : x, y : y};
+    }
+}
+
+
+sendMessage("streamlit:componentReady", {apiVersion: 1});
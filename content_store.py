@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+
+class DescriptionStore:
+    def __init__(self, path: str):
+        """
+        Initialize a local store of page descriptions keyed by Pinecone vector id,
+        so the verbose text does not have to travel in every query response.
+
+        Args:
+            path: SQLite database file holding the descriptions
+        """
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return this thread's connection, opening it on first use.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions "
+                "(id TEXT PRIMARY KEY, image_description TEXT NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def put_many(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """
+        Insert or replace (id, image_description) rows.
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO descriptions (id, image_description) VALUES (?, ?)", rows
+            )
+
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        """
+        Fetch the descriptions for several ids in one query.
+        """
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        cursor = self._connection().execute(
+            f"SELECT id, image_description FROM descriptions WHERE id IN ({placeholders})", ids
+        )
+        return dict(cursor.fetchall())
@@ -1,44 +1,116 @@
+import asyncio
+import multiprocessing
 import os
-import re
+import shutil
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from pdf2image import convert_from_path
-import PyPDF2
+from pdf2image import convert_from_path, pdfinfo_from_path
 
 # Define the documents directory path
 DOCUMENTS_DIR = Path("documents")
 
+# Rasterization cost grows with DPI squared, previews are displayed scaled down anyway
+DPI = int(os.getenv("PDF2PNG_DPI", "150"))
+
+# Text-only documents can be rendered in grayscale, a third of the RGB bytes
+GRAYSCALE = os.getenv("PDF2PNG_GRAYSCALE", "").lower() in ("1", "true", "yes")
+
+# Poppler threads per PDF, the process pool already spreads PDFs across cores
+PAGE_THREADS = 2
+
 def check_poppler():
     """
-    Check if Poppler is installed and return the path or None.
+    Check if Poppler is installed by looking its binaries up on PATH.
     On Windows, pdf2image requires Poppler to be installed separately.
     """
+    return shutil.which("pdftoppm") is not None or shutil.which("pdftocairo") is not None
+
+# Replace each character that is invalid in file names with an underscore
+_SANITIZE_TABLE = str.maketrans(dict.fromkeys('\\/*?:"<>|', "_"))
+
+def sanitize_filename(filename):
+    """Remove characters that are invalid in file names."""
+    return filename.translate(_SANITIZE_TABLE)
+
+def is_converted(pdf_path, output_dir, sanitized_pdf_name, num_pages):
+    """
+    Check whether every page already has a PNG that is newer than the PDF.
+    """
+    pdf_mtime = pdf_path.stat().st_mtime
+    for page_num in range(1, num_pages + 1):
+        image_path = output_dir / f"{sanitized_pdf_name}_page_{page_num}.png"
+        try:
+            if image_path.stat().st_mtime < pdf_mtime:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+def _convert_one(pdf_path):
+    """
+    Convert every page of one PDF to PNG images in a subfolder named after it.
+    """
+    pdf_name = pdf_path.stem  # Get the file name without extension
+    sanitized_pdf_name = sanitize_filename(pdf_name)
+    
+    # Create a subfolder for this PDF
+    output_dir = DOCUMENTS_DIR / sanitized_pdf_name
+    output_dir.mkdir(exist_ok=True)
+    
+    print(f"Processing: {pdf_name}")
+    
     try:
-        # Try importing convert_from_path which requires poppler
-        from pdf2image import convert_from_path
+        # Get the number of pages in the PDF from poppler's pdfinfo
+        num_pages = pdfinfo_from_path(pdf_path)["Pages"]
         
-        # Try a simple conversion to check if poppler works
-        test_pdf = next(DOCUMENTS_DIR.glob("*.pdf"), None)
-        if test_pdf:
-            # Just try to get the first page to test
-            convert_from_path(test_pdf, first_page=1, last_page=1)
-            return True
-        return True  # No PDFs found, but we'll assume Poppler is working
+        if is_converted(pdf_path, output_dir, sanitized_pdf_name, num_pages):
+            print(f"Skipping {pdf_name} (already converted)")
+            return
+        
+        print(f"Converting {num_pages} pages to PNG images...")
+        
+        # Convert each page to an image, poppler writes the PNGs straight into output_dir
+        # so no page is held in memory as a PIL image
+        # If you have Poppler installed but it's not in PATH, uncomment and modify the line below:
+        # paths = convert_from_path(pdf_path, dpi=300, fmt='png', poppler_path='C:\\path\\to\\poppler-xx\\bin')
+        paths = convert_from_path(
+            pdf_path,
+            dpi=DPI,  # Set PDF2PNG_DPI to adjust quality
+            fmt='png',
+            grayscale=GRAYSCALE,
+            thread_count=PAGE_THREADS,
+            output_folder=str(output_dir),
+            output_file=f"{sanitized_pdf_name}_raw",
+            paths_only=True,
+            use_pdftocairo=True  # cairo's PNG writer is faster and produces smaller files than pdftoppm
+        )
+        
+        # Rename poppler's zero-padded output to the expected names, paths come back in page order
+        for i, path in enumerate(paths):
+            page_num = i + 1  # Pages are 1-indexed for naming
+            image_path = output_dir / f"{sanitized_pdf_name}_page_{page_num}.png"
+            os.replace(path, image_path)
+            print(f"  Saved: {image_path.name}")
+        
+        print(f"Successfully processed: {pdf_name}")
+    
     except Exception as e:
-        if "poppler" in str(e).lower():
-            return False
-        # If error is not related to poppler, assume it's available
-        return True
+        print(f"Error processing {pdf_name}: {e}")
 
-def sanitize_filename(filename):
-    """Remove characters that are invalid in file names."""
-    return re.sub(r'[\\/*?:"<>|]', "_", filename)
+# Held for a whole run, so overlapping callers in one process never rasterize the same PDFs at once
+_CONVERSION_LOCK = threading.Lock()
 
 def convert_pdf_to_images():
     """
     Convert each page of all PDF files in the documents directory to PNG images.
     Creates a subfolder for each PDF and saves each page as PNG inside it.
     """
+    with _CONVERSION_LOCK:
+        _convert_all()
+
+def _convert_all():
     # Check for Poppler dependency on Windows
     if sys.platform.startswith("win") and not check_poppler():
         print("\nERROR: Poppler is not installed or not found in your system path.")
@@ -64,46 +136,19 @@ def convert_pdf_to_images():
     
     print(f"Found {len(pdf_files)} PDF files.")
     
-    # Process each PDF file
-    for pdf_path in pdf_files:
-        pdf_name = pdf_path.stem  # Get the file name without extension
-        sanitized_pdf_name = sanitize_filename(pdf_name)
-        
-        # Create a subfolder for this PDF
-        output_dir = DOCUMENTS_DIR / sanitized_pdf_name
-        output_dir.mkdir(exist_ok=True)
-        
-        print(f"Processing: {pdf_name}")
-        
-        try:
-            # Get the number of pages in the PDF
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                num_pages = len(pdf_reader.pages)
-            
-            print(f"Converting {num_pages} pages to PNG images...")
-            
-            # Convert each page to an image
-            # If you have Poppler installed but it's not in PATH, uncomment and modify the line below:
-            # images = convert_from_path(pdf_path, dpi=300, fmt='png', poppler_path='C:\\path\\to\\poppler-xx\\bin')
-            images = convert_from_path(
-                pdf_path,
-                dpi=300,  # You can adjust DPI for quality
-                fmt='png',
-                thread_count=os.cpu_count()
-            )
-            
-            # Save each image
-            for i, image in enumerate(images):
-                page_num = i + 1  # Pages are 1-indexed for naming
-                image_path = output_dir / f"{sanitized_pdf_name}_page_{page_num}.png"
-                image.save(image_path, "PNG")
-                print(f"  Saved: {image_path.name}")
-            
-            print(f"Successfully processed: {pdf_name}")
-        
-        except Exception as e:
-            print(f"Error processing {pdf_name}: {e}")
+    # Rasterize several PDFs at once, each in its own process. Spawned rather than forked,
+    # forking a threaded server such as Streamlit can copy locks held by other threads
+    with ProcessPoolExecutor(
+        max_workers=max(1, (os.cpu_count() or 1) // 2), mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        list(executor.map(_convert_one, pdf_files))
+
+def convert_pdf_to_images_async():
+    """
+    Run convert_pdf_to_images in a worker thread so an event loop, or the
+    Streamlit server, is not blocked while poppler rasterizes.
+    """
+    return asyncio.to_thread(convert_pdf_to_images)
 
 if __name__ == "__main__":
     print("Starting PDF to PNG conversion...")
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import threading
+import uuid
+import zipfile
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+import diskcache
+import numpy as np
+from cachetools import LRUCache
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, namespace: str, maxsize: int = 1024):
+        """
+        Initialize a two-tier cache of query embeddings.
+
+        Args:
+            directory: Folder backing the on-disk store, survives restarts
+            namespace: Embedding model identifier mixed into every key so
+                switching models never serves stale vectors
+            maxsize: Number of vectors kept in the in-process LRU tier
+        """
+        self.namespace = namespace
+        self.memory = LRUCache(maxsize=maxsize)
+        self.disk = diskcache.Cache(directory)
+
+    def key(self, text: str) -> str:
+        """
+        Build the cache key for a piece of text.
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest() + ":" + self.namespace
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """
+        Return the cached embedding for text, or None on a miss.
+        """
+        key = self.key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        packed = self.disk.get(key)
+        if packed is None:
+            return None
+
+        vector = array("f", packed).tolist()
+        self.memory[key] = vector
+        return vector
+
+    def set(self, text: str, vector: List[float]) -> None:
+        """
+        Store an embedding in both tiers, float32-packed on disk.
+        """
+        key = self.key(text)
+        self.memory[key] = vector
+        self.disk.set(key, array("f", vector).tobytes())
+
+
+# Number of set bits in every possible byte, for Hamming distances on packed signs
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint16)
+
+
+class SemanticCache:
+    def __init__(self, path: str, namespace: str, threshold: float = 0.86, persist_every: int = 16,
+                 shortlist: int = 32):
+        """
+        Initialize a cache that maps query embeddings to retrieval results so
+        paraphrased queries can skip the vector search.
+
+        Vectors are held int8-quantized with a per-row scale, alongside a
+        bit-packed sign code used to shortlist candidates by Hamming distance
+        before the int8 re-rank.
+
+        Args:
+            path: .npz file the cache is loaded from and persisted to
+            namespace: Index and corpus identifier stored with the cache, a file
+                written under another namespace is ignored so results from a
+                switched or re-uploaded index are never served
+            threshold: Minimum cosine similarity for a cached result to be reused
+            persist_every: Number of insertions between writes to disk
+            shortlist: Number of sign-code nearest neighbours re-ranked exactly
+        """
+        self.path = path
+        self.namespace = namespace
+        self.threshold = threshold
+        self.persist_every = persist_every
+        self.shortlist = shortlist
+        self.codes = None
+        self.scales = None
+        self.signs = None
+        self.payloads: List[str] = []
+        self._pending = 0
+        # add runs on the agent loop, persist may also run from an exit handler
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                # Caches written before namespacing may belong to any index, start over
+                if "namespace" not in data or str(data["namespace"]) != self.namespace:
+                    return
+                codes, scales, signs = data["codes"], data["scales"], data["signs"]
+                payloads = data["payloads"].tolist()
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # An unreadable cache only costs the hits it held, start empty and overwrite it
+            return
+        self.codes, self.scales, self.signs, self.payloads = codes, scales, signs, payloads
+
+    def persist(self) -> None:
+        """
+        Write the cached vectors and payloads to disk.
+        """
+        with self._lock:
+            if self.codes is None or not self._pending:
+                return
+            # Written aside and renamed over the cache, so an interrupted write never truncates it
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, namespace=np.array(self.namespace), codes=self.codes, scales=self.scales,
+                         signs=self.signs, payloads=np.array(self.payloads))
+            os.replace(tmp_path, self.path)
+            self._pending = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    @staticmethod
+    def _quantize(rows: np.ndarray):
+        """
+        Quantize unit-normalized rows to int8 codes, per-row scales and packed sign bits.
+        """
+        maxabs = np.abs(rows).max(axis=1)
+        maxabs[maxabs == 0] = 1.0
+        codes = np.clip(np.rint(rows * (127 / maxabs[:, np.newaxis])), -127, 127).astype(np.int8)
+        scales = (maxabs / 127).astype(np.float32)
+        signs = np.packbits(rows > 0, axis=1)
+        return codes, scales, signs
+
+    def lookup(self, vector: List[float]) -> Optional[str]:
+        """
+        Return the cached payload of the most similar query, or None if no
+        cached query reaches the similarity threshold.
+        """
+        if self.codes is None or self.codes.shape[1] != len(vector):
+            return None
+        query = self._normalize(vector)
+
+        candidates = np.arange(len(self.payloads))
+        if len(candidates) > self.shortlist:
+            hamming = _POPCOUNT[self.signs ^ np.packbits(query > 0)].sum(axis=1)
+            candidates = np.argpartition(hamming, self.shortlist)[:self.shortlist]
+
+        # Rows were unit-normalized before quantizing, so the dequantized dot product is the cosine
+        sims = (self.codes[candidates].astype(np.float32) @ query) * self.scales[candidates]
+        best = int(np.argmax(sims))
+        if sims[best] >= self.threshold:
+            return self.payloads[candidates[best]]
+        return None
+
+    def add(self, vector: List[float], payload: str) -> None:
+        """
+        Cache the payload produced for a query embedding.
+        """
+        codes, scales, signs = self._quantize(self._normalize(vector)[np.newaxis, :])
+        with self._lock:
+            if self.codes is None or self.codes.shape[1] != codes.shape[1]:
+                self.codes, self.scales, self.signs = codes, scales, signs
+                self.payloads = [payload]
+            else:
+                self.codes = np.vstack([self.codes, codes])
+                self.scales = np.concatenate([self.scales, scales])
+                self.signs = np.vstack([self.signs, signs])
+                self.payloads.append(payload)
+            self._pending += 1
+        if self._pending >= self.persist_every:
+            self.persist()
+
+
+class HotDocumentCache:
+    def __init__(self, max_documents: int = 8, min_score: float = 0.6):
+        """
+        Initialize an in-memory copy of every vector of recently retrieved
+        documents, so follow-up queries about the same documents can be
+        answered with a local dot product instead of a Pinecone round-trip.
+
+        Args:
+            max_documents: Number of documents kept, least recently used evicted first
+            min_score: Best local cosine similarity needed to trust the local
+                result over a full Pinecone search
+        """
+        self.max_documents = max_documents
+        self.min_score = min_score
+        self.documents = OrderedDict()
+        self._stacked = None
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self.documents
+
+    def add(self, document_id: str, ids: List[str], vectors: List[List[float]],
+            metadata: List[dict]) -> None:
+        """
+        Cache all vectors of one document.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.documents[document_id] = (list(ids), matrix / norms, list(metadata))
+        self.documents.move_to_end(document_id)
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+        self._stacked = None
+
+    def _stack(self):
+        if self._stacked is None:
+            ids, metadata, owners = [], [], []
+            for document_id, (doc_ids, _, doc_metadata) in self.documents.items():
+                ids.extend(doc_ids)
+                metadata.extend(doc_metadata)
+                owners.extend([document_id] * len(doc_ids))
+            matrix = np.vstack([matrix for _, matrix, _ in self.documents.values()])
+            self._stacked = (ids, matrix, metadata, owners)
+        return self._stacked
+
+    def query(self, vector: List[float], top_k: int) -> Optional[List[dict]]:
+        """
+        Return the top_k cached matches in Pinecone's match shape, or None when
+        nothing is cached or the best local score is below min_score.
+        """
+        if not self.documents:
+            return None
+        ids, matrix, metadata, owners = self._stack()
+        if matrix.shape[1] != len(vector):
+            return None
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        sims = matrix @ (query / norm if norm else query)
+
+        k = min(top_k, len(sims))
+        best = np.argpartition(-sims, k - 1)[:k]
+        best = best[np.argsort(-sims[best], kind="stable")]
+        if sims[best[0]] < self.min_score:
+            return None
+
+        # Recency order only drives eviction, the stacked rows stay valid
+        for document_id in dict.fromkeys(owners[i] for i in best):
+            self.documents.move_to_end(document_id)
+        return [{'id': ids[i], 'score': float(sims[i]), 'metadata': metadata[i]} for i in best]
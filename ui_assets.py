@@ -0,0 +1,431 @@
+# Static page CSS and HTML for the chat interface. Streamlit re-executes chat_interface.py
+# into a fresh module on every rerun, this module is imported instead, so its constants and
+# caches are built once per server process.
+from datetime import datetime
+from functools import lru_cache
+
+
+# Page styling
+PAGE_CSS = """
+        <style>
+        /* Hide default Streamlit header */
+        header[data-testid="stHeader"] {
+            display: none;
+        }
+        
+        /* Remove default margins and padding */
+        .block-container {
+            padding-top: 0 !important;
+            padding-bottom: 0 !important;
+            margin-top: 0 !important;
+        }
+        
+        [data-testid="stAppViewContainer"] {
+            padding-top: 0 !important;
+            overflow: hidden !important;
+        }
+
+        section[data-testid="stSidebar"] {
+            margin-top: 90px !important;
+        }
+        
+        /* Frosted glass header */
+        .logo-container {
+            position: fixed;
+            display: flex;
+            align-items: center;
+            justify-content: space-between;
+            padding: 1.5rem 3rem;
+            background: rgba(255, 255, 255, 0.7) !important;
+            margin: 0;
+            width: 100vw;
+            height: 90px;
+            left: 50%;
+            right: 50%;
+            margin-left: -50vw;
+            margin-right: -50vw;
+            border-bottom: 1px solid rgba(255, 255, 255, 0.3);
+            box-shadow: 0 4px 30px rgba(0, 0, 0, 0.1);
+            top: 0;
+            z-index: 1000;
+        }
+        
+        /* Left section with Agusto logo and title */
+        .left-section {
+            display: flex;
+            align-items: center;
+        }
+        
+        .agusto-logo {
+            height: 60px;
+            margin-right: 20px;
+            object-fit: contain;
+        }
+        
+        /* Right section with Vizyx logo and powered by text */
+        .right-section {
+            display: flex;
+            flex-direction: column;
+            align-items: flex-end;
+            justify-content: center;
+        }
+        
+        .vizyx-logo {
+            height: 40px;
+            object-fit: contain;
+            margin-bottom: 4px;
+        }
+        
+        .powered-by {
+            color: #666;
+            font-size: 12px;
+            margin: 0;
+            padding: 0;
+        }
+
+        /* Frosted glass footer */
+        .footer-container {
+            position: fixed;
+            bottom: 0;
+            left: 0;
+            right: 0;
+            background: rgba(255, 255, 255, 0.1) !important;
+            padding: 1rem 1rem;
+            border-top: 1px solid rgba(255, 255, 255, 0.3);
+            box-shadow: 0 -4px 30px rgba(0, 0, 0, 0.1);
+            z-index: 1000;
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+        }
+
+        .footer-text {
+            color: rgba(0, 0, 0, 0.7);
+            font-size: 0.8rem;
+        }
+
+        /* Adjust main content to account for footer */
+        .main-content {
+            padding-top: 90px !important;
+            padding-bottom: 60px !important;
+            margin-top: 0 !important;
+        }
+
+        /* Prevent horizontal scroll */
+        body {
+            overflow-x: hidden !important;
+        }
+
+        .title-container {
+            flex-grow: 1;
+            display: flex;
+            flex-direction: column;
+            justify-content: center;
+            gap: 2px;  /* Reduced spacing between title and subtitle */
+        }
+        
+        .main-title {
+            color: #2a1f5f;
+            font-size: 24px;
+            margin: 0;
+            padding: 0;
+            font-weight: bold;
+            line-height: 1;  /* Reduced line height */
+        }
+        
+        .sub-title {
+            color: #4f4f4f;
+            font-size: 16px;
+            margin: 2px 0 0 0;  /* Reduced top margin */
+            padding: 0;
+            line-height: 1;  /* Reduced line height */
+        }
+
+        /* Gradient background for the entire app */
+        .stApp {
+            background: linear-gradient(135deg, 
+                #f5f7fa 10%, 
+                #e8edf5 35%, 
+                #e0e9f0 60%, 
+                #d8e5eb 85%, 
+                #d0e1e6 100%) !important;
+            background-attachment: fixed !important;
+        }
+
+        /* Make main content area transparent to show gradient */
+        [data-testid="stAppViewContainer"] {
+            background: transparent !important;
+        }
+
+        /* Chat message styling with semi-transparent background */
+        [data-testid="stChatMessage"] {
+            border: 1px solid rgba(220, 220, 220, 0.8);
+            border-radius: 10px;
+            padding: 1rem;
+            margin: 1rem 0;
+            background-color: rgba(255, 255, 255, 0.7) !important;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+
+        /* Style user messages */
+        [data-testid="stChatMessage"][data-testid="user"] {
+            border-left: 4px solid #0066cc;
+            background-color: rgba(255, 255, 255, 0.7) !important;
+        }
+
+        /* Style assistant messages */
+        [data-testid="stChatMessage"][data-testid="assistant"] {
+            border-left: 4px solid #00cc88;
+            background-color: rgba(255, 255, 255, 0.7) !important;
+            margin-top: 0.5rem; /* Reduced top margin by 50% */
+        }
+
+        /* Style columns inside chat messages */
+        [data-testid="stChatMessage"] > div > div > div > div[data-testid="column"] {
+            background-color: rgba(250, 250, 250, 0.3) !important;
+            padding: 1rem;
+            border-radius: 8px;
+        }
+
+        /* Style metrics section */
+        [data-testid="stChatMessage"] .stMetric {
+            background-color: rgba(255, 255, 255, 0.7) !important;
+            padding: 0.5rem;
+            border-radius: 5px;
+            border: 1px solid rgba(240, 240, 240, 0.5);
+        }
+
+        /* Style document preview section */
+        [data-testid="stChatMessage"] img {
+            border: 1px solid rgba(0, 0, 0, 0.5);
+            border-radius: 10px;
+        }
+
+        /* Style sidebar with gradient */
+        [data-testid="stSidebar"] {
+            background: linear-gradient(180deg, 
+                rgba(255, 255, 255, 0.9) 0%, 
+                rgba(255, 255, 255, 0.8) 100%) !important;
+        }
+
+        /* Keep header solid */
+        .logo-container {
+            background-color: white !important;
+            border-bottom: 1px solid rgba(229, 229, 229, 0.5);
+        }
+
+        /* Style chat input container */
+        .stChatInputContainer {
+            background-color: rgba(255, 0, 0, 1) !important;
+            border-radius: 10px;
+            padding: 1rem;
+        }
+
+        /* Add spacing between sections */
+        [data-testid="stChatMessage"] .stMarkdown {
+            margin-bottom: 1rem;
+        }
+
+        /* Ensure text remains readable */
+        .stMarkdown {
+            color: #1f1f1f !important;
+        }
+
+        /* Enhanced frosted glass effect for both header and footer */
+        .glass-effect {
+            background: rgba(255, 255, 255, 0.7) !important;
+            border: 1px solid rgba(255, 255, 255, 0.3) !important;
+            box-shadow: 0 4px 30px rgba(0, 0, 0, 0.1) !important;
+        }
+
+        /* Footer styling */
+        .footer-content {
+            position: fixed !important;
+            bottom: 15px !important;
+            left: 0 !important;
+            right: 0 !important;
+            height: 30px !important;
+            display: flex !important;
+            justify-content: space-between !important;
+            align-items: center !important;
+            padding: 0.3rem 3rem !important;
+            font-size: 0.75rem !important;
+            color: rgba(0, 0, 0, 0.6) !important;
+            z-index: 998 !important;
+            background: none !important;
+        }
+
+        /* Style the chat input container */
+        .stChatInputContainer {
+            padding: 10px;
+        }
+        
+        /* Style the chat input box */
+        .stChatInput {
+            border: 1px solid grey !important;
+            border-radius: 8px !important;
+        }
+        
+        /* Style the chat input when focused */
+        .stChatInput:focus {
+            border: 1px solid grey !important;
+            box-shadow: none !important;
+        }
+
+        /* Keep fixed chrome from invalidating layout of the scrolling content */
+        .logo-container,
+        .footer-content,
+        .stChatInput {
+            contain: layout paint;
+        }
+
+        /* Skip layout and paint of chat messages scrolled out of view */
+        [data-testid="stChatMessage"] {
+            content-visibility: auto;
+            contain-intrinsic-size: auto 400px;
+        }
+        </style>
+    """
+
+
+# Fixed chat input at bottom - responsive design
+CHAT_INPUT_CSS = """
+        <style>
+        /* Fixed chat input container at bottom */
+        .stChatInput {
+            position: fixed !important;
+            bottom: 70px !important;
+            left: 50% !important;
+            transform: translateX(-50%) !important;
+            width: 90% !important;
+            max-width: 800px !important;
+            z-index: 1000 !important;
+            background: rgba(255, 255, 255, 0.95) !important;
+            border-radius: 12px !important;
+            border: 1px solid rgba(0, 0, 0, 0.1) !important;
+            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.15) !important;
+            padding: 8px 16px !important;
+            box-sizing: border-box !important;
+        }
+        
+        /* Responsive adjustments for different screen sizes */
+        @media (min-width: 768px) {
+            .stChatInput {
+                width: 80% !important;
+                max-width: 900px !important;
+            }
+        }
+        
+        @media (min-width: 1200px) {
+            .stChatInput {
+                width: 60% !important;
+                max-width: 1000px !important;
+            }
+        }
+        
+        @media (min-width: 1600px) {
+            .stChatInput {
+                width: 50% !important;
+                max-width: 1000px !important;
+            }
+        }
+        
+        /* Add padding to bottom of main content to prevent overlap */
+        .main .block-container {
+            padding-bottom: 140px !important;
+        }
+        
+        /* Style the chat input textarea */
+        .stChatInput textarea {
+            border: none !important;
+            background: transparent !important;
+            width: 100% !important;
+        }
+        
+        .stChatInput textarea:focus {
+            box-shadow: none !important;
+            outline: none !important;
+        }
+        
+        /* Ensure the input container doesn't overflow */
+        .stChatInput > div {
+            width: 100% !important;
+        }
+        </style>
+    """
+
+# Document preview styling, shared by every message in the chat history
+PREVIEW_CSS = """
+        <style>
+            .document-preview {
+                max-height: 1000px;
+                overflow-y: auto;
+                padding: 2px;
+                margin-bottom: 0;
+            }
+            .stSubheader {
+                margin-bottom: 0 !important;
+                padding-bottom: 0 !important;
+            }
+            /* Adjust slideshow container height and spacing */
+            .slideshow-container {
+                height: auto !important;
+                min-height: 800px !important;
+                margin-bottom: 40px !important; /* Add space for dots */
+                position: relative;
+            }
+            /* Ensure images fill the container */
+            .slideshow-image {
+                height: 800px !important;
+                width: 100% !important;
+                object-fit: contain !important;
+            }
+            /* Fix dots container position */
+            .dots-container {
+                position: absolute;
+                bottom: -30px;
+                left: 0;
+                right: 0;
+                text-align: center;
+                background: rgba(255, 255, 255, 0.8);
+                padding: 5px 0;
+                z-index: 100;
+            }
+            /* Style the dots */
+            .dot {
+                position: static !important;
+                top: auto !important;
+                margin: 0 4px !important;
+            }
+        </style>
+    """
+
+ALL_CSS = PAGE_CSS + CHAT_INPUT_CSS + PREVIEW_CSS
+
+@lru_cache(maxsize=None)
+def header_html(logo_url):
+    """Header HTML with both logos, built once per process and logo URL."""
+    # Both logos are the same static file, the browser fetches and caches it once
+    return f"""
+        <div class="logo-container glass-effect">
+            <div class="left-section">
+                <img src="{logo_url}" alt="Agusto Logo" class="agusto-logo"/>
+                <div class="title-container">
+                    <h2 class="main-title">Research Agent</h2>
+                    <p class="sub-title">AI-Powered Research</p>
+                </div>
+            </div>
+            <div class="right-section">
+                <img src="{logo_url}" alt="Vizyx Logo" class="vizyx-logo"/>
+                <p class="powered-by">Powered by Vizyx</p>
+            </div>
+        </div>
+        <div class="main-content">
+    """
+
+# Footer HTML, the year is taken when the server process starts
+FOOTER_HTML = f"""
+        <div class="footer-content">
+            <span>© {datetime.now().year} Vizyx Ltd. All rights reserved. For demonstration purposes only.</span>
+        </div>
+    """